@@ -1,10 +1,48 @@
+import io
+import os
+import re
+import csv
+import sys
+import mmap
 import json
+import time
+import struct
+import sqlite3
+import bisect
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import threading
+import contextlib
+import functools
+import multiprocessing
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import List, Dict, Optional, Tuple, Deque, Set, Iterable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MULTA_POR_DIA = 0.50
+
+
+@functools.lru_cache(maxsize=None)
+def ordinal_desde_texto(texto: str) -> int:
+    return date.fromisoformat(texto).toordinal()
+
+
+@functools.lru_cache(maxsize=None)
+def texto_desde_ordinal(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
 
 
 class Libro:
+    __slots__ = ('id', 'titulo', 'autor', 'stock')
+
     def __init__(self, id: int, titulo: str, autor: str, stock: int):
         self.id = id
         self.titulo = titulo
@@ -21,23 +59,126 @@ class Libro:
 
 
 class Prestamo:
+    __slots__ = ('libro_id', 'usuario', '_ordinal_prestamo', '_ordinal_devolucion', 'devuelto')
+
     def __init__(self, libro_id: int, usuario: str, dias_prestamo: int = 14):
         self.libro_id = libro_id
-        self.usuario = usuario
-        self.fecha_prestamo = datetime.now().date()
-        self.fecha_devolucion = self.fecha_prestamo + timedelta(days=dias_prestamo)
+        self.usuario = sys.intern(usuario)
+        self._ordinal_prestamo = datetime.now().date().toordinal()
+        self._ordinal_devolucion = self._ordinal_prestamo + dias_prestamo
         self.devuelto = False
 
-    def calcular_multa(self) -> float:
+    @classmethod
+    def desde_ordinales(cls, libro_id: int, usuario: str, ordinal_prestamo: int,
+                        ordinal_devolucion: int, devuelto: bool) -> 'Prestamo':
+        prestamo = cls.__new__(cls)
+        prestamo.libro_id = libro_id
+        prestamo.usuario = sys.intern(usuario)
+        prestamo._ordinal_prestamo = ordinal_prestamo
+        prestamo._ordinal_devolucion = ordinal_devolucion
+        prestamo.devuelto = devuelto
+        return prestamo
+
+    @classmethod
+    def desde_dict(cls, p: Dict) -> 'Prestamo':
+        return cls.desde_ordinales(
+            p['libro_id'],
+            p['usuario'],
+            ordinal_desde_texto(p['fecha_prestamo']),
+            ordinal_desde_texto(p['fecha_devolucion']),
+            p.get('devuelto', False)
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "libro_id": self.libro_id,
+            "usuario": self.usuario,
+            "fecha_prestamo": texto_desde_ordinal(self._ordinal_prestamo),
+            "fecha_devolucion": texto_desde_ordinal(self._ordinal_devolucion),
+            "devuelto": self.devuelto
+        }
+
+    @property
+    def fecha_prestamo(self) -> date:
+        return date.fromordinal(self._ordinal_prestamo)
+
+    @fecha_prestamo.setter
+    def fecha_prestamo(self, valor: date):
+        self._ordinal_prestamo = valor.toordinal()
+
+    @property
+    def fecha_devolucion(self) -> date:
+        return date.fromordinal(self._ordinal_devolucion)
+
+    @fecha_devolucion.setter
+    def fecha_devolucion(self, valor: date):
+        self._ordinal_devolucion = valor.toordinal()
+
+    def calcular_multa(self, hoy: Optional[date] = None) -> float:
         if self.devuelto:
             return 0.0
             
-        hoy = datetime.now().date()
-        if hoy <= self.fecha_devolucion:
+        hoy = (hoy or datetime.now().date()).toordinal()
+        if hoy <= self._ordinal_devolucion:
             return 0.0
             
-        dias_retraso = (hoy - self.fecha_devolucion).days
-        return max(0, dias_retraso) * 0.50
+        dias_retraso = hoy - self._ordinal_devolucion
+        return max(0, dias_retraso) * MULTA_POR_DIA
+
+
+class TablaPrestamos:
+    def __init__(self, prestamos: Iterable[Prestamo] = ()):
+        self.libro_id = array('q')
+        self.usuario = array('i')
+        self.vencimiento = array('i')
+        self.devuelto = array('b')
+        self.usuarios: List[str] = []
+        self._codigos: Dict[str, int] = {}
+        self._filas_activas: Dict[Tuple[int, str], int] = {}
+        for prestamo in prestamos:
+            self.agregar(prestamo)
+
+    def agregar(self, prestamo: Prestamo):
+        codigo = self._codigos.get(prestamo.usuario)
+        if codigo is None:
+            codigo = self._codigos[prestamo.usuario] = len(self.usuarios)
+            self.usuarios.append(prestamo.usuario)
+
+        fila = len(self.libro_id)
+        self.libro_id.append(prestamo.libro_id)
+        self.usuario.append(codigo)
+        self.vencimiento.append(prestamo._ordinal_devolucion)
+        self.devuelto.append(prestamo.devuelto)
+        if not prestamo.devuelto:
+            self._filas_activas[(prestamo.libro_id, prestamo.usuario)] = fila
+
+    def marcar_devuelto(self, libro_id: int, usuario: str):
+        self.devuelto[self._filas_activas.pop((libro_id, usuario))] = 1
+
+    def calcular_multas(self, hoy: int) -> Tuple[List[int], List[float]]:
+        if np is None:
+            filas = sorted(f for f in self._filas_activas.values() if self.vencimiento[f] < hoy)
+            return filas, [(hoy - self.vencimiento[f]) * MULTA_POR_DIA for f in filas]
+
+        if not self.vencimiento:
+            return [], []
+        retraso = hoy - np.frombuffer(self.vencimiento, dtype=np.intc)
+        retraso[np.frombuffer(self.devuelto, dtype=np.int8) != 0] = 0
+        filas = np.flatnonzero(retraso > 0)
+        return filas.tolist(), (retraso[filas] * MULTA_POR_DIA).tolist()
+
+    def multas_por_usuario(self, hoy: int) -> Dict[str, float]:
+        filas, multas = self.calcular_multas(hoy)
+        if np is None or not filas:
+            totales: Dict[str, float] = {}
+            for fila, multa in zip(filas, multas):
+                usuario = self.usuarios[self.usuario[fila]]
+                totales[usuario] = totales.get(usuario, 0.0) + multa
+            return totales
+
+        codigos = np.frombuffer(self.usuario, dtype=np.intc)[filas]
+        sumas = np.bincount(codigos, weights=multas, minlength=len(self.usuarios))
+        return {self.usuarios[c]: float(sumas[c]) for c in np.flatnonzero(sumas)}
 
 
 class Notificador:
@@ -46,69 +187,1287 @@ class Notificador:
         await asyncio.sleep(2)
         print(f"\n📧 Notificación enviada a {usuario}: {mensaje}")
 
+    @staticmethod
+    async def enviar_lote(lote: Dict[str, List[str]]):
+        await asyncio.sleep(2)
+        for usuario, mensajes in lote.items():
+            if len(mensajes) == 1:
+                print(f"\n📧 Notificación enviada a {usuario}: {mensajes[0]}")
+                continue
+            print(f"\n📧 {len(mensajes)} notificaciones enviadas a {usuario}:")
+            for mensaje in mensajes:
+                print(f"   - {mensaje}")
 
-class Biblioteca:
+
+class DespachadorNotificaciones:
+    def __init__(self, trabajadores: int = 4, capacidad: int = 1000,
+                 lote_maximo: Optional[int] = None, ventana_ms: float = 200):
+        self.trabajadores = trabajadores
+        self.capacidad = capacidad
+        self.lote_maximo = lote_maximo
+        self.ventana_ms = ventana_ms
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cola: Optional[asyncio.Queue] = None
+        self._tareas: List[asyncio.Task] = []
+
+    def _iniciar(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cola = asyncio.Queue(maxsize=self.capacidad)
+            self._tareas = [loop.create_task(self._trabajador()) for _ in range(self.trabajadores)]
+        return self._cola
+
+    def encolar(self, usuario: str, mensaje: str) -> bool:
+        try:
+            cola = self._iniciar()
+        except RuntimeError:
+            print(f"⚠️ Sin bucle de eventos activo. No se notificará a {usuario}")
+            return False
+
+        try:
+            cola.put_nowait((usuario, mensaje))
+        except asyncio.QueueFull:
+            print(f"⚠️ Cola de notificaciones llena. No se notificará a {usuario}")
+            return False
+        return True
+
+    def encolar_lote(self, lote: Dict[str, List[str]]) -> bool:
+        if not lote:
+            return True
+        try:
+            cola = self._iniciar()
+        except RuntimeError:
+            print(f"⚠️ Sin bucle de eventos activo. No se notificará a {len(lote)} usuarios")
+            return False
+
+        descartados = 0
+        for usuario, mensajes in lote.items():
+            for mensaje in mensajes:
+                try:
+                    cola.put_nowait((usuario, mensaje))
+                except asyncio.QueueFull:
+                    descartados += 1
+        if descartados:
+            print(f"⚠️ Cola de notificaciones llena. Se descartan {descartados} notificaciones")
+            return False
+        return True
+
+    async def enviar(self, usuario: str, mensaje: str):
+        await self._iniciar().put((usuario, mensaje))
+
+    async def _recoger_lote(self, primero: Tuple[str, str]) -> List[Tuple[str, str]]:
+        lote = [primero]
+        limite = self._loop.time() + self.ventana_ms / 1000
+        while len(lote) < self.lote_maximo:
+            try:
+                lote.append(self._cola.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            restante = limite - self._loop.time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _trabajador(self):
+        while True:
+            lote = [await self._cola.get()]
+            try:
+                if not self.lote_maximo:
+                    await Notificador.enviar_notificacion(*lote[0])
+                    continue
+
+                lote = await self._recoger_lote(lote[0])
+                agrupado: Dict[str, List[str]] = {}
+                for usuario, mensaje in lote:
+                    agrupado.setdefault(usuario, []).append(mensaje)
+                await Notificador.enviar_lote(agrupado)
+            except Exception as e:
+                usuarios = ', '.join(dict.fromkeys(usuario for usuario, _ in lote))
+                print(f"⚠️ Error al notificar a {usuarios}: {e}")
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def pendientes(self) -> int:
+        return self._cola.qsize() if self._cola is not None else 0
+
+    async def cerrar(self):
+        if self._loop is not asyncio.get_running_loop():
+            return
+        await self._cola.join()
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._loop = None
+        self._cola = None
+        self._tareas = []
+
+
+class LectorJSONIncremental:
+    _ESPACIOS = re.compile(r'[ \t\n\r]*')
+    _FIN_NUMERO = re.compile(r'[0-9.eE+-]*')
+
+    def __init__(self, f, tamano_bloque: int = 1 << 16):
+        self._f = f
+        self._tamano_bloque = tamano_bloque
+        self._buffer = ''
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _rellenar(self) -> bool:
+        bloque = self._f.read(self._tamano_bloque)
+        if not bloque:
+            return False
+        self._buffer = self._buffer[self._pos:] + bloque
+        self._pos = 0
+        return True
+
+    def _siguiente(self) -> str:
+        while True:
+            self._pos = self._ESPACIOS.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._rellenar():
+                raise json.JSONDecodeError("Fin de archivo inesperado", self._buffer, self._pos)
+
+    def _consumir(self, esperados: str) -> str:
+        caracter = self._siguiente()
+        if caracter not in esperados:
+            raise json.JSONDecodeError(f"Se esperaba uno de {esperados!r}", self._buffer, self._pos)
+        self._pos += 1
+        return caracter
+
+    def _valor(self):
+        self._siguiente()
+        while True:
+            try:
+                valor, fin = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._rellenar():
+                    raise
+                continue
+            cortado = fin == len(self._buffer) or (
+                isinstance(valor, (int, float)) and self._FIN_NUMERO.fullmatch(self._buffer, fin)
+            )
+            if cortado and self._rellenar():
+                continue
+            self._pos = fin
+            return valor
+
+    def _elementos(self):
+        if self._siguiente() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._valor()
+            if self._consumir(',]') == ']':
+                return
+
+    def campos(self):
+        self._consumir('{')
+        if self._siguiente() == '}':
+            return
+        while True:
+            clave = self._valor()
+            self._consumir(':')
+            if self._siguiente() == '[':
+                self._pos += 1
+                elementos = self._elementos()
+                yield clave, elementos
+                for _ in elementos:
+                    pass
+            else:
+                yield clave, self._valor()
+            if self._consumir(',}') == '}':
+                return
+
+
+MAGIA_BINARIA = b'BIBL'
+VERSION_BINARIA = 1
+_CABECERA_BINARIA = struct.Struct('<4sHQIII')
+_REGISTRO_LIBRO = struct.Struct('<qIIi')
+_REGISTRO_PRESTAMO = struct.Struct('<qIiiB')
+
+
+def escribir_snapshot_binario(f, secuencia: int, libros: List[Tuple], prestamos: List[Tuple]):
+    cadenas: Dict[str, int] = {}
+
+    def indice(texto: str) -> int:
+        posicion = cadenas.get(texto)
+        if posicion is None:
+            posicion = cadenas[texto] = len(cadenas)
+        return posicion
+
+    registros_libros = b''.join(
+        _REGISTRO_LIBRO.pack(libro_id, indice(titulo), indice(autor), stock)
+        for libro_id, titulo, autor, stock in libros
+    )
+    registros_prestamos = b''.join(
+        _REGISTRO_PRESTAMO.pack(libro_id, indice(usuario), ordinal_prestamo, ordinal_devolucion, devuelto)
+        for libro_id, usuario, ordinal_prestamo, ordinal_devolucion, devuelto in prestamos
+    )
+    codificadas = [cadena.encode('utf-8') for cadena in cadenas]
+    longitudes = array('I', map(len, codificadas))
+    if sys.byteorder == 'big':
+        longitudes.byteswap()
+
+    f.write(_CABECERA_BINARIA.pack(MAGIA_BINARIA, VERSION_BINARIA, secuencia,
+                                   len(codificadas), len(libros), len(prestamos)))
+    f.write(longitudes.tobytes())
+    f.write(b''.join(codificadas))
+    f.write(registros_libros)
+    f.write(registros_prestamos)
+
+
+def leer_snapshot_binario(datos: bytes) -> Tuple[int, List[Libro], List[Prestamo]]:
+    magia, version, secuencia, num_cadenas, num_libros, num_prestamos = _CABECERA_BINARIA.unpack_from(datos)
+    if magia != MAGIA_BINARIA or version != VERSION_BINARIA:
+        raise ValueError("Formato binario desconocido")
+
+    posicion = _CABECERA_BINARIA.size
+    longitudes = array('I')
+    longitudes.frombytes(datos[posicion:posicion + 4 * num_cadenas])
+    if sys.byteorder == 'big':
+        longitudes.byteswap()
+    posicion += 4 * num_cadenas
+
+    cadenas = []
+    for longitud in longitudes:
+        cadenas.append(datos[posicion:posicion + longitud].decode('utf-8'))
+        posicion += longitud
+
+    fin_libros = posicion + num_libros * _REGISTRO_LIBRO.size
+    fin_prestamos = fin_libros + num_prestamos * _REGISTRO_PRESTAMO.size
+    if fin_prestamos != len(datos):
+        raise ValueError("Archivo binario truncado o corrupto")
+
+    vista = memoryview(datos)
+    libros = [
+        Libro(libro_id, cadenas[titulo], cadenas[autor], stock)
+        for libro_id, titulo, autor, stock in _REGISTRO_LIBRO.iter_unpack(vista[posicion:fin_libros])
+    ]
+    prestamos = [
+        Prestamo.desde_ordinales(libro_id, cadenas[usuario], ordinal_prestamo, ordinal_devolucion, bool(devuelto))
+        for libro_id, usuario, ordinal_prestamo, ordinal_devolucion, devuelto
+        in _REGISTRO_PRESTAMO.iter_unpack(vista[fin_libros:fin_prestamos])
+    ]
+    return secuencia, libros, prestamos
+
+
+class PoliticaFsync:
+    MODOS = ['siempre', 'lotes', 'nunca']
+
+    def __init__(self, modo: str = 'nunca', cada: int = 10):
+        if modo not in self.MODOS:
+            raise ValueError(f"Política de fsync inválida: {modo}")
+        self.modo = modo
+        self.cada = cada
+        self._escrituras = 0
+
+    def aplicar(self, f) -> bool:
+        if self.modo == 'nunca':
+            return False
+        if self.modo == 'lotes':
+            self._escrituras += 1
+            if self._escrituras < self.cada:
+                return False
+            self._escrituras = 0
+        f.flush()
+        os.fsync(f.fileno())
+        return True
+
+
+def sincronizar_directorio(ruta: str):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    descriptor = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class Almacenamiento(ABC):
+    incremental = False
+
+    def __init__(self, ruta: str, fsync: str = 'nunca'):
+        self.ruta = ruta
+        self.politica_fsync = PoliticaFsync(fsync)
+
+    @abstractmethod
+    def leer(self) -> Tuple[int, List[Libro], List[Prestamo]]:
+        pass
+
+    @abstractmethod
+    def capturar(self, secuencia: int, libros: Iterable[Libro], prestamos: Iterable[Prestamo]) -> Dict:
+        pass
+
+    @abstractmethod
+    def escribir(self, captura: Dict):
+        pass
+
+    @abstractmethod
+    def registrar(self, cambio: Dict):
+        pass
+
+    def registrar_lote(self, cambios: List[Dict]):
+        for cambio in cambios:
+            self.registrar(cambio)
+
+
+class AlmacenamientoArchivo(Almacenamiento):
+    @contextlib.contextmanager
+    def _abrir_atomico(self, modo: str):
+        temporal = self.ruta + '.tmp'
+        try:
+            with open(temporal, modo) as f:
+                yield f
+                sincronizado = self.politica_fsync.aplicar(f)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporal)
+            raise
+        os.replace(temporal, self.ruta)
+        if sincronizado:
+            sincronizar_directorio(self.ruta)
+
+    def registrar(self, cambio: Dict):
+        raise TypeError(f"{type(self).__name__} guarda snapshots completos y no admite cambios incrementales")
+
+
+class AlmacenamientoJSON(AlmacenamientoArchivo):
+    def leer(self) -> Tuple[int, List[Libro], List[Prestamo]]:
+        secuencia = 0
+        libros: List[Libro] = []
+        prestamos: List[Prestamo] = []
+        with open(self.ruta, 'r') as f:
+            for clave, valor in LectorJSONIncremental(f).campos():
+                if clave == 'libros':
+                    libros = [Libro(l['id'], l['titulo'], l['autor'], l['stock']) for l in valor]
+                elif clave == 'prestamos':
+                    prestamos = [Prestamo.desde_dict(p) for p in valor]
+                elif clave == 'secuencia':
+                    secuencia = valor
+        return secuencia, libros, prestamos
+
+    def capturar(self, secuencia: int, libros: Iterable[Libro], prestamos: Iterable[Prestamo]) -> Dict:
+        return {
+            "secuencia": secuencia,
+            "libros": [libro.to_dict() for libro in libros],
+            "prestamos": [prestamo.to_dict() for prestamo in prestamos]
+        }
+
+    def escribir(self, captura: Dict):
+        with self._abrir_atomico('w') as f:
+            json.dump(captura, f, indent=2)
+
+
+class AlmacenamientoBinario(AlmacenamientoArchivo):
+    def leer(self) -> Tuple[int, List[Libro], List[Prestamo]]:
+        with open(self.ruta, 'rb') as f:
+            return leer_snapshot_binario(f.read())
+
+    def capturar(self, secuencia: int, libros: Iterable[Libro], prestamos: Iterable[Prestamo]) -> Dict:
+        return {
+            "secuencia": secuencia,
+            "libros": [(l.id, l.titulo, l.autor, l.stock) for l in libros],
+            "prestamos": [
+                (p.libro_id, p.usuario, p._ordinal_prestamo, p._ordinal_devolucion, p.devuelto)
+                for p in prestamos
+            ]
+        }
+
+    def escribir(self, captura: Dict):
+        with self._abrir_atomico('wb') as f:
+            escribir_snapshot_binario(f, captura['secuencia'], captura['libros'], captura['prestamos'])
+
+
+class AlmacenamientoSQLite(Almacenamiento):
+    incremental = True
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS libros (
+            id INTEGER PRIMARY KEY,
+            titulo TEXT NOT NULL,
+            autor TEXT NOT NULL,
+            stock INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS prestamos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            libro_id INTEGER NOT NULL,
+            usuario TEXT NOT NULL,
+            fecha_prestamo INTEGER NOT NULL,
+            fecha_devolucion INTEGER NOT NULL,
+            devuelto INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS prestamos_activos ON prestamos (libro_id, usuario) WHERE devuelto = 0;
+    """
+
+    SINCRONIZACION = {'siempre': 'FULL', 'lotes': 'NORMAL', 'nunca': 'OFF'}
+
+    def __init__(self, ruta: str, fsync: str = 'nunca'):
+        super().__init__(ruta, fsync)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute(f"PRAGMA synchronous = {self.SINCRONIZACION[fsync]}")
+        self._conexion.executescript(self.ESQUEMA)
+
+    def leer(self) -> Tuple[int, List[Libro], List[Prestamo]]:
+        with self._lock:
+            libros = [
+                Libro(libro_id, titulo, autor, stock)
+                for libro_id, titulo, autor, stock
+                in self._conexion.execute("SELECT id, titulo, autor, stock FROM libros ORDER BY id")
+            ]
+            prestamos = [
+                Prestamo.desde_ordinales(libro_id, usuario, ordinal_prestamo, ordinal_devolucion, False)
+                for libro_id, usuario, ordinal_prestamo, ordinal_devolucion in self._conexion.execute(
+                    "SELECT libro_id, usuario, fecha_prestamo, fecha_devolucion "
+                    "FROM prestamos WHERE devuelto = 0 ORDER BY id"
+                )
+            ]
+        return 0, libros, prestamos
+
+    def capturar(self, secuencia: int, libros: Iterable[Libro], prestamos: Iterable[Prestamo]) -> Dict:
+        return {
+            "secuencia": secuencia,
+            "libros": [(l.id, l.titulo, l.autor, l.stock) for l in libros]
+        }
+
+    def escribir(self, captura: Dict):
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO libros (id, titulo, autor, stock) VALUES (?, ?, ?, ?)",
+                captura['libros']
+            )
+
+    def registrar(self, cambio: Dict):
+        with self._lock, self._conexion:
+            self._aplicar(cambio)
+
+    def registrar_lote(self, cambios: List[Dict]):
+        with self._lock, self._conexion:
+            for cambio in cambios:
+                self._aplicar(cambio)
+
+    def _aplicar(self, cambio: Dict):
+        op = cambio['op']
+        if op == 'agregar':
+            l = cambio['libro']
+            self._conexion.execute(
+                "INSERT INTO libros (id, titulo, autor, stock) VALUES (?, ?, ?, ?)",
+                (l['id'], l['titulo'], l['autor'], l['stock'])
+            )
+        elif op == 'prestar':
+            self._conexion.execute("UPDATE libros SET stock = stock - 1 WHERE id = ?", (cambio['libro_id'],))
+            self._conexion.execute(
+                "INSERT INTO prestamos (libro_id, usuario, fecha_prestamo, fecha_devolucion) VALUES (?, ?, ?, ?)",
+                (cambio['libro_id'], cambio['usuario'],
+                 ordinal_desde_texto(cambio['fecha_prestamo']), ordinal_desde_texto(cambio['fecha_devolucion']))
+            )
+        elif op == 'devolver':
+            self._conexion.execute(
+                "UPDATE prestamos SET devuelto = 1 WHERE libro_id = ? AND usuario = ? AND devuelto = 0",
+                (cambio['libro_id'], cambio['usuario'])
+            )
+            self._conexion.execute("UPDATE libros SET stock = stock + 1 WHERE id = ?", (cambio['libro_id'],))
+
+
+ALMACENAMIENTOS = {
+    'json': (AlmacenamientoJSON, 'biblioteca.json'),
+    'binario': (AlmacenamientoBinario, 'biblioteca.bin'),
+    'sqlite': (AlmacenamientoSQLite, 'biblioteca.db'),
+}
+
+
+def convertir_json_a_binario(origen: str, destino: str):
+    secuencia, libros, prestamos = AlmacenamientoJSON(origen).leer()
+    binario = AlmacenamientoBinario(destino)
+    binario.escribir(binario.capturar(secuencia, libros, prestamos))
+    print(f"✅ {len(libros)} libros y {len(prestamos)} préstamos convertidos a {destino}")
+
+
+def libro_desde_registro(registro: Dict) -> Libro:
+    titulo, autor = registro['titulo'], registro['autor']
+    if not isinstance(titulo, str) or not isinstance(autor, str):
+        raise TypeError("titulo y autor deben ser texto")
+    return Libro(int(registro['id']), titulo, autor, int(registro['stock']))
+
+
+def leer_libros_csv(f) -> Iterable[Optional[Libro]]:
+    for numero, fila in enumerate(csv.DictReader(f), 2):
+        try:
+            yield libro_desde_registro(fila)
+        except (KeyError, TypeError, ValueError):
+            print(f"❌ Fila {numero} inválida: {fila}")
+            yield None
+
+
+def leer_libros_jsonl(f) -> Iterable[Optional[Libro]]:
+    for numero, linea in enumerate(f, 1):
+        if not linea.strip():
+            continue
+        try:
+            yield libro_desde_registro(json.loads(linea))
+        except (KeyError, TypeError, ValueError):
+            print(f"❌ Línea {numero} inválida: {linea.strip()}")
+            yield None
+
+
+LECTORES_LIBROS = {
+    'csv': leer_libros_csv,
+    'jsonl': leer_libros_jsonl,
+    'ndjson': leer_libros_jsonl,
+}
+
+MAGIA_CATALOGO = b'BCAT'
+VERSION_CATALOGO = 1
+_CABECERA_CATALOGO = struct.Struct('<4sHI')
+_REGISTRO_CATALOGO = struct.Struct('<qiIIII')
+_ID_CATALOGO = struct.Struct('<q')
+
+
+def escribir_catalogo_mapeado(ruta: str, libros: Iterable[Libro]):
+    registros = []
+    cadenas = bytearray()
+    for libro in sorted(libros, key=lambda l: l.id):
+        titulo = libro.titulo.encode('utf-8')
+        autor = libro.autor.encode('utf-8')
+        registros.append(_REGISTRO_CATALOGO.pack(
+            libro.id, libro.stock, len(cadenas), len(titulo), len(cadenas) + len(titulo), len(autor)
+        ))
+        cadenas += titulo
+        cadenas += autor
+
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(_CABECERA_CATALOGO.pack(MAGIA_CATALOGO, VERSION_CATALOGO, len(registros)))
+        f.write(b''.join(registros))
+        f.write(cadenas)
+    os.replace(temporal, ruta)
+
+
+class CatalogoMapeado:
+    def __init__(self, ruta: str):
+        with open(ruta, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, version, self._num_registros = _CABECERA_CATALOGO.unpack_from(self._mapa)
+        if magia != MAGIA_CATALOGO or version != VERSION_CATALOGO:
+            raise ValueError(f"Catálogo mapeado desconocido: {ruta}")
+        self._inicio_cadenas = _CABECERA_CATALOGO.size + self._num_registros * _REGISTRO_CATALOGO.size
+        self._cargados: Dict[int, Libro] = {}
+        self._extras: List[Libro] = []
+
+    def _desplazamiento(self, posicion: int) -> int:
+        return _CABECERA_CATALOGO.size + posicion * _REGISTRO_CATALOGO.size
+
+    def _id_en(self, posicion: int) -> int:
+        return _ID_CATALOGO.unpack_from(self._mapa, self._desplazamiento(posicion))[0]
+
+    def _buscar(self, libro_id: int) -> Optional[int]:
+        bajo, alto = 0, self._num_registros
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._id_en(medio) < libro_id:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < self._num_registros and self._id_en(bajo) == libro_id:
+            return bajo
+        return None
+
+    def _leer(self, posicion: int) -> Libro:
+        libro_id, stock, inicio_titulo, largo_titulo, inicio_autor, largo_autor = \
+            _REGISTRO_CATALOGO.unpack_from(self._mapa, self._desplazamiento(posicion))
+        inicio_titulo += self._inicio_cadenas
+        inicio_autor += self._inicio_cadenas
+        titulo = self._mapa[inicio_titulo:inicio_titulo + largo_titulo].decode('utf-8')
+        autor = self._mapa[inicio_autor:inicio_autor + largo_autor].decode('utf-8')
+        return Libro(libro_id, titulo, autor, stock)
+
+    def get(self, libro_id: int, defecto: Optional[Libro] = None) -> Optional[Libro]:
+        libro = self._cargados.get(libro_id)
+        if libro is None:
+            posicion = self._buscar(libro_id)
+            if posicion is None:
+                return defecto
+            libro = self._cargados[libro_id] = self._leer(posicion)
+        return libro
+
+    def __getitem__(self, libro_id: int) -> Libro:
+        libro = self.get(libro_id)
+        if libro is None:
+            raise KeyError(libro_id)
+        return libro
+
+    def __setitem__(self, libro_id: int, libro: Libro):
+        self._cargados[libro_id] = libro
+
+    def __contains__(self, libro_id: int) -> bool:
+        return libro_id in self._cargados or self._buscar(libro_id) is not None
+
+    def append(self, libro: Libro):
+        if self._buscar(libro.id) is None:
+            self._extras.append(libro)
+
+    def __len__(self) -> int:
+        return self._num_registros + len(self._extras)
+
+    def __iter__(self):
+        for posicion in range(self._num_registros):
+            libro = self._cargados.get(self._id_en(posicion))
+            yield libro if libro is not None else self._leer(posicion)
+        yield from self._extras
+
+    def cargar_superposicion(self, libros: Iterable[Libro]):
+        for libro in libros:
+            self._cargados[libro.id] = libro
+            self.append(libro)
+
+    def modificados(self) -> List[Libro]:
+        libros = []
+        for libro_id, libro in self._cargados.items():
+            posicion = self._buscar(libro_id)
+            if posicion is None or _REGISTRO_CATALOGO.unpack_from(self._mapa, self._desplazamiento(posicion))[1] != libro.stock:
+                libros.append(libro)
+        return libros
+
+
+def normalizar_texto(texto: str) -> str:
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto: str) -> List[str]:
+    return re.findall(r'\w+', normalizar_texto(texto))
+
+
+class IndiceTexto:
     def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+
+    def agregar(self, libro: Libro):
+        for token in set(tokenizar(libro.titulo) + tokenizar(libro.autor)):
+            self._postings.setdefault(token, set()).add(libro.id)
+
+    def buscar(self, consulta: str) -> Set[int]:
+        tokens = set(tokenizar(consulta))
+        if not tokens:
+            return set()
+        conjuntos = sorted((self._postings.get(t, set()) for t in tokens), key=len)
+        return conjuntos[0].intersection(*conjuntos[1:])
+
+
+def normalizar_clave(texto: str) -> str:
+    clave = ' '.join(tokenizar(texto))
+    if clave and texto[-1:].isspace():
+        clave += ' '
+    return clave
+
+
+class IndicePrefijos:
+    def __init__(self, campo: str, libros: Iterable[Libro] = ()):
+        self.campo = campo
+        self._claves: List[Tuple[str, int]] = sorted(
+            (normalizar_clave(getattr(l, campo)), l.id) for l in libros
+        )
+
+    def agregar(self, libro: Libro):
+        bisect.insort(self._claves, (normalizar_clave(getattr(libro, self.campo)), libro.id))
+
+    def buscar(self, prefijo: str, limite: int) -> List[int]:
+        prefijo = normalizar_clave(prefijo)
+        if not prefijo:
+            return []
+        ids = []
+        inicio = bisect.bisect_left(self._claves, (prefijo,))
+        for clave, libro_id in self._claves[inicio:inicio + limite]:
+            if not clave.startswith(prefijo):
+                break
+            ids.append(libro_id)
+        return ids
+
+
+class IndiceStock:
+    def __init__(self, libros: Iterable[Libro] = ()):
+        self._claves: List[Tuple[int, int]] = sorted((l.stock, l.id) for l in libros)
+
+    def agregar(self, libro: Libro):
+        bisect.insort(self._claves, (libro.stock, libro.id))
+
+    def actualizar(self, libro: Libro, stock_anterior: int):
+        posicion = bisect.bisect_left(self._claves, (stock_anterior, libro.id))
+        del self._claves[posicion]
+        self.agregar(libro)
+
+    def rango(self, minimo: Optional[int], maximo: Optional[int], limite: Optional[int]) -> List[int]:
+        inicio = 0 if minimo is None else bisect.bisect_left(self._claves, (minimo,))
+        fin = len(self._claves) if maximo is None else bisect.bisect_left(self._claves, (maximo + 1,))
+        if limite is not None:
+            fin = min(fin, inicio + limite)
+        return [libro_id for _, libro_id in self._claves[inicio:fin]]
+
+
+class Metricas:
+    LIMITES = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, prefijo: str = 'biblioteca', limites: Iterable[float] = LIMITES):
+        self.prefijo = prefijo
+        self.limites = tuple(sorted(limites))
+        self._lock = threading.Lock()
+        self._operaciones: Dict[str, List] = {}
+
+    def registrar(self, operacion: str, segundos: float, error: bool = False):
+        cubeta = bisect.bisect_left(self.limites, segundos)
+        with self._lock:
+            datos = self._operaciones.get(operacion)
+            if datos is None:
+                datos = self._operaciones[operacion] = [0, 0, 0.0, [0] * (len(self.limites) + 1)]
+            datos[0] += 1
+            datos[1] += error
+            datos[2] += segundos
+            datos[3][cubeta] += 1
+
+    def envolver(self, operacion: str, funcion):
+        registrar = self.registrar
+        reloj = time.perf_counter
+
+        if asyncio.iscoroutinefunction(funcion):
+            @functools.wraps(funcion)
+            async def medida_async(*args, **kwargs):
+                inicio = reloj()
+                try:
+                    resultado = await funcion(*args, **kwargs)
+                except BaseException:
+                    registrar(operacion, reloj() - inicio, True)
+                    raise
+                registrar(operacion, reloj() - inicio)
+                return resultado
+            return medida_async
+
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = reloj()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except BaseException:
+                registrar(operacion, reloj() - inicio, True)
+                raise
+            registrar(operacion, reloj() - inicio)
+            return resultado
+        return medida
+
+    def instrumentar(self, objeto):
+        for nombre in dir(type(objeto)):
+            if not nombre.startswith('_') and callable(getattr(type(objeto), nombre)):
+                setattr(objeto, nombre, self.envolver(nombre, getattr(objeto, nombre)))
+
+    def reiniciar(self):
+        with self._lock:
+            self._operaciones = {}
+
+    def _copiar(self) -> Dict[str, Tuple[int, int, float, List[int]]]:
+        with self._lock:
+            return {nombre: (c, e, s, list(cubetas)) for nombre, (c, e, s, cubetas) in self._operaciones.items()}
+
+    def a_dict(self) -> Dict:
+        operaciones = {}
+        for nombre, (cuenta, errores, suma, cubetas) in sorted(self._copiar().items()):
+            acumulado = 0
+            histograma = {}
+            for limite, cantidad in zip(self.limites + (float('inf'),), cubetas):
+                acumulado += cantidad
+                histograma['+Inf' if limite == float('inf') else repr(limite)] = acumulado
+            operaciones[nombre] = {
+                "cuenta": cuenta,
+                "errores": errores,
+                "suma_s": suma,
+                "media_ms": suma / cuenta * 1000 if cuenta else 0.0,
+                "histograma_s": histograma,
+            }
+        return {"operaciones": operaciones}
+
+    def a_json(self) -> str:
+        return json.dumps(self.a_dict(), indent=2)
+
+    def a_prometheus(self) -> str:
+        latencia = f"{self.prefijo}_operacion_segundos"
+        errores = f"{self.prefijo}_operacion_errores_total"
+        datos = self.a_dict()["operaciones"]
+        lineas = [
+            f"# HELP {latencia} Latencia de las operaciones de Biblioteca.",
+            f"# TYPE {latencia} histogram",
+        ]
+        for nombre, valores in datos.items():
+            for limite, acumulado in valores["histograma_s"].items():
+                lineas.append(f'{latencia}_bucket{{operacion="{nombre}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{latencia}_sum{{operacion="{nombre}"}} {valores["suma_s"]!r}')
+            lineas.append(f'{latencia}_count{{operacion="{nombre}"}} {valores["cuenta"]}')
+        lineas.append(f"# HELP {errores} Operaciones de Biblioteca terminadas con excepción.")
+        lineas.append(f"# TYPE {errores} counter")
+        for nombre, valores in datos.items():
+            lineas.append(f'{errores}{{operacion="{nombre}"}} {valores["errores"]}')
+        return "\n".join(lineas) + "\n"
+
+
+class Biblioteca:
+    def __init__(self, archivo: Optional[str] = None, journal: bool = False, compactar_cada: int = 1000,
+                 flush_cada: Optional[int] = None, flush_ms: Optional[float] = None, formato: str = 'json',
+                 catalogo: Optional[str] = None, almacenamiento: Optional[Almacenamiento] = None,
+                 fsync: str = 'nunca', notificaciones: Optional[DespachadorNotificaciones] = None,
+                 metricas: Optional[Metricas] = None, concurrente: bool = False, franjas: int = 64):
+        if almacenamiento is None:
+            if formato not in ALMACENAMIENTOS:
+                raise ValueError(f"Formato de persistencia inválido: {formato}")
+            clase, archivo_por_defecto = ALMACENAMIENTOS[formato]
+            almacenamiento = clase(archivo or archivo_por_defecto, fsync)
+        if concurrente and not (journal or flush_cada is not None or flush_ms is not None
+                                or almacenamiento.incremental):
+            raise ValueError("El modo concurrente requiere journal, flush_cada/flush_ms o un almacenamiento "
+                             "incremental: un snapshot por escritura serializaría todas las operaciones")
+        self.almacenamiento = almacenamiento
+        self.archivo = almacenamiento.ruta
+        self.archivo_journal = self.archivo + '.log'
+        self.catalogo = catalogo
+        self.notificaciones = notificaciones or DespachadorNotificaciones()
+        self.journal = journal
+        self.compactar_cada = compactar_cada
+        self.flush_cada = flush_cada
+        self.flush_ms = flush_ms
         self.libros: List[Libro] = []
         self.prestamos: List[Prestamo] = []
+        self._indice_libros: Dict[int, Libro] = {}
+        self._prestamos_activos: Dict[Tuple[int, str], Prestamo] = {}
+        self._indice_texto: Optional[IndiceTexto] = None
+        self._indices_prefijos: Dict[str, IndicePrefijos] = {}
+        self._indice_stock: Optional[IndiceStock] = None
+        self._tabla_prestamos: Optional[TablaPrestamos] = None
+        self._secuencia = 0
+        self._secuencia_guardada = 0
+        self._secuencia_journal = 0
+        self._registros_journal = 0
+        self._journal_pendiente: Deque[Tuple[int, str]] = deque()
+        self._cambios_pendientes = 0
+        self._ultimo_flush = time.monotonic()
+        self._tarea_flush: Optional[asyncio.Task] = None
+        self._despertar_flush: Optional[asyncio.Event] = None
+        self._lock_escritura = threading.Lock()
+        self._ejecutor_persistencia: Optional[ThreadPoolExecutor] = None
+        self.concurrente = concurrente
+        self._locks_libros = [threading.Lock() for _ in range(franjas)] if concurrente else []
+        self._lock_prestamos = threading.Lock() if concurrente else contextlib.nullcontext()
+        self._lock_registro = threading.RLock() if concurrente else contextlib.nullcontext()
+        self.metricas = metricas
+        if metricas is not None:
+            metricas.instrumentar(self)
+            self._escribir_pendientes = metricas.envolver('persistencia', self._escribir_pendientes)
         self.cargar_datos()
 
     def cargar_datos(self):
+        secuencia, libros, prestamos = 0, [], []
         try:
-            with open('biblioteca.json', 'r') as f:
-                data = json.load(f)
-                
-                self.libros = [
-                    Libro(l['id'], l['titulo'], l['autor'], l['stock']) 
-                    for l in data.get('libros', [])
-                ]
-            
-                self.prestamos = []
-                for p in data.get('prestamos', []):
-                    prestamo = Prestamo(
-                        p['libro_id'], 
-                        p['usuario'],
-                    )
-                    prestamo.fecha_prestamo = datetime.strptime(p['fecha_prestamo'], '%Y-%m-%d').date()
-                    prestamo.fecha_devolucion = datetime.strptime(p['fecha_devolucion'], '%Y-%m-%d').date()
-                    prestamo.devuelto = p['devuelto']
-                    self.prestamos.append(prestamo)
-                    
+            secuencia, libros, prestamos = self.almacenamiento.leer()
         except FileNotFoundError:
             print("⚠️ No se encontraron datos previos. Iniciando con datos vacíos.")
-        except json.JSONDecodeError:
-            print("⚠️ Error al leer el archivo de datos. Iniciando con datos vacíos.")
+        except (ValueError, struct.error):
+            copia = self.archivo + '.corrupto'
+            os.replace(self.archivo, copia)
+            with contextlib.suppress(FileNotFoundError):
+                os.replace(self.archivo_journal, self.archivo_journal + '.corrupto')
+            print(f"⚠️ Error al leer el archivo de datos (copia en {copia}). Iniciando con datos vacíos.")
+
+        with self._lock_registro:
+            if self.catalogo:
+                catalogo = CatalogoMapeado(self.catalogo)
+                catalogo.cargar_superposicion(libros)
+                self.libros = self._indice_libros = catalogo
+            else:
+                self.libros = libros
+                self._indice_libros = {l.id: l for l in libros}
+            self.prestamos = prestamos
+            self._prestamos_activos = {(p.libro_id, p.usuario): p for p in prestamos if not p.devuelto}
+            self._secuencia = self._secuencia_guardada = secuencia
+            self._secuencia_journal = self._registros_journal = self._cambios_pendientes = 0
+            self._journal_pendiente.clear()
+            self._indice_texto = None
+            self._indices_prefijos = {}
+            self._indice_stock = None
+            self._tabla_prestamos = None
+
+            if not self.almacenamiento.incremental:
+                self._reproducir_journal()
+
+    def _reproducir_journal(self):
+        try:
+            f = open(self.archivo_journal, 'rb+')
+        except FileNotFoundError:
+            return
+
+        with f:
+            while True:
+                posicion = f.tell()
+                linea = f.readline()
+                if not linea:
+                    break
+                try:
+                    if not linea.endswith(b'\n'):
+                        raise ValueError("registro sin terminar")
+                    cambio = json.loads(linea)
+                except ValueError:
+                    print("⚠️ Registro incompleto al final del journal. Se descartan los cambios restantes.")
+                    f.truncate(posicion)
+                    break
+                if cambio['seq'] > self._secuencia:
+                    try:
+                        self._aplicar_cambio(cambio)
+                    except KeyError:
+                        copia = self.archivo_journal + '.corrupto'
+                        f.seek(posicion)
+                        with open(copia, 'wb') as descartados:
+                            descartados.write(f.read())
+                        f.truncate(posicion)
+                        print(f"⚠️ El journal no coincide con los datos cargados (copia en {copia}). "
+                              "Se descartan los cambios restantes.")
+                        break
+                    self._secuencia = cambio['seq']
+                self._registros_journal += 1
+                self._secuencia_journal = cambio['seq']
+
+    def _aplicar_cambio(self, cambio: Dict):
+        op = cambio['op']
+        if op == 'agregar':
+            l = cambio['libro']
+            self._indexar_libro(Libro(l['id'], l['titulo'], l['autor'], l['stock']))
+        elif op == 'prestar':
+            libro = self._indice_libros[cambio['libro_id']]
+            prestamo = Prestamo.desde_dict(cambio)
+            self._registrar_prestamo(prestamo)
+            self._ajustar_stock(libro, -1)
+        elif op == 'devolver':
+            libro = self._indice_libros[cambio['libro_id']]
+            self._cerrar_prestamo(cambio['libro_id'], cambio['usuario'])
+            self._ajustar_stock(libro, 1)
+
+    def _bloquear_libros(self, libro_ids: Iterable[int]):
+        if not self.concurrente:
+            return contextlib.nullcontext()
+        pila = contextlib.ExitStack()
+        for franja in sorted({libro_id % len(self._locks_libros) for libro_id in libro_ids}):
+            pila.enter_context(self._locks_libros[franja])
+        return pila
+
+    def _persistir(self, pendiente):
+        if pendiente is not None:
+            pendiente()
+
+    def _anotar_cambios(self, cambios: List[Dict], diferir: bool = False):
+        if not cambios:
+            return None
+        if self.almacenamiento.incremental:
+            self._secuencia += len(cambios)
+            return functools.partial(self.almacenamiento.registrar_lote, cambios)
+
+        for cambio in cambios:
+            self._secuencia += 1
+            if self.journal:
+                cambio['seq'] = self._secuencia
+                self._journal_pendiente.append((self._secuencia, json.dumps(cambio, separators=(',', ':'))))
+        self._cambios_pendientes += len(cambios)
+
+        if self.flush_cada is None and self.flush_ms is None:
+            if diferir:
+                return self._flush_agrupado
+            return functools.partial(self._escribir_pendientes, self._preparar_flush())
+        if self.flush_cada is not None and self._cambios_pendientes >= self.flush_cada:
+            programar = functools.partial(self._programar_flush, 0)
+        elif self.flush_ms is not None:
+            programar = functools.partial(self._programar_flush, self.flush_ms / 1000)
+        else:
+            return None
+        if diferir:
+            programar()
+            return None
+        return programar
+
+    def _obtener_ejecutor_persistencia(self) -> ThreadPoolExecutor:
+        if self._ejecutor_persistencia is None:
+            self._ejecutor_persistencia = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistencia')
+        return self._ejecutor_persistencia
+
+    async def _persistir_async(self, pendiente):
+        if pendiente is None:
+            return
+        if asyncio.iscoroutinefunction(pendiente):
+            await pendiente()
+        else:
+            await asyncio.get_running_loop().run_in_executor(self._obtener_ejecutor_persistencia(), pendiente)
+
+    async def _flush_agrupado(self):
+        await asyncio.sleep(0)
+        with self._lock_registro:
+            captura = self._preparar_flush() if self._cambios_pendientes else None
+        await asyncio.get_running_loop().run_in_executor(self._obtener_ejecutor_persistencia(),
+                                                         self._escribir_pendientes, captura)
+
+    def _programar_flush(self, retraso: float):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if time.monotonic() - self._ultimo_flush >= retraso:
+                self.flush()
+            return
+
+        if self._tarea_flush is None:
+            self._despertar_flush = asyncio.Event()
+            self._tarea_flush = loop.create_task(self._flush_en_segundo_plano(retraso))
+        elif retraso == 0:
+            self._despertar_flush.set()
+
+    async def _flush_en_segundo_plano(self, retraso: float):
+        try:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._despertar_flush.wait(), retraso)
+            loop = asyncio.get_running_loop()
+            while self._cambios_pendientes:
+                with self._lock_registro:
+                    captura = self._preparar_flush()
+                await loop.run_in_executor(self._obtener_ejecutor_persistencia(), self._escribir_pendientes, captura)
+        finally:
+            self._tarea_flush = None
+
+    def flush(self):
+        with self._lock_registro:
+            if not self._cambios_pendientes:
+                return
+            captura = self._preparar_flush()
+        self._escribir_pendientes(captura)
+
+    def _preparar_flush(self) -> Optional[Dict]:
+        self._cambios_pendientes = 0
+        self._ultimo_flush = time.monotonic()
+        if self.journal and self._registros_journal + len(self._journal_pendiente) < self.compactar_cada:
+            return None
+        return self._snapshot()
+
+    def _escribir_pendientes(self, snapshot: Optional[Dict]):
+        with self._lock_escritura:
+            if snapshot is None:
+                self._escribir_journal()
+            else:
+                self._escribir_snapshot(snapshot)
+
+    def _escribir_journal(self):
+        lineas = []
+        while self._journal_pendiente:
+            self._secuencia_journal, linea = self._journal_pendiente.popleft()
+            lineas.append(linea + '\n')
+        if lineas:
+            with open(self.archivo_journal, 'a') as f:
+                f.writelines(lineas)
+                self.almacenamiento.politica_fsync.aplicar(f)
+            self._registros_journal += len(lineas)
+
+    def _libros_a_guardar(self) -> Iterable[Libro]:
+        if isinstance(self.libros, CatalogoMapeado):
+            return self.libros.modificados()
+        return self.libros
+
+    def _snapshot(self) -> Dict:
+        return self.almacenamiento.capturar(self._secuencia, self._libros_a_guardar(), self.prestamos)
+
+    def _escribir_snapshot(self, data: Dict):
+        secuencia = data['secuencia']
+        if secuencia < self._secuencia_guardada:
+            return
+
+        self.almacenamiento.escribir(data)
+        self._secuencia_guardada = secuencia
+
+        while self._journal_pendiente and self._journal_pendiente[0][0] <= secuencia:
+            self._journal_pendiente.popleft()
+        if self._registros_journal and self._secuencia_journal <= secuencia:
+            open(self.archivo_journal, 'w').close()
+            self._registros_journal = 0
+
+    def generar_catalogo_mapeado(self, ruta: str):
+        with self._lock_registro:
+            escribir_catalogo_mapeado(ruta, self.libros)
+            self.catalogo = ruta
+            self.libros = self._indice_libros = CatalogoMapeado(ruta)
+        self.guardar_datos()
+        print(f"✅ Catálogo de {len(self.libros)} libros generado en {ruta}")
+
+    def compactar(self):
+        self.guardar_datos()
 
     def guardar_datos(self):
-        data = {
-            "libros": [libro.to_dict() for libro in self.libros],
-            "prestamos": [
-                {
-                    "libro_id": p.libro_id,
-                    "usuario": p.usuario,
-                    "fecha_prestamo": p.fecha_prestamo.strftime('%Y-%m-%d'),
-                    "fecha_devolucion": p.fecha_devolucion.strftime('%Y-%m-%d'),
-                    "devuelto": p.devuelto
-                } 
-                for p in self.prestamos
-            ]
-        }
-        with open('biblioteca.json', 'w') as f:
-            json.dump(data, f, indent=2)
+        with self._lock_registro:
+            self._cambios_pendientes = 0
+            self._ultimo_flush = time.monotonic()
+            captura = self._snapshot()
+        self._escribir_pendientes(captura)
+
+    def _agregar_libro(self, libro: Libro, diferir: bool = False):
+        with self._bloquear_libros([libro.id]):
+            with self._lock_registro:
+                if libro.id in self._indice_libros:
+                    print(f"❌ Ya existe un libro con ID {libro.id}")
+                    return False, None
+
+                self._indexar_libro(libro)
+                pendiente = self._anotar_cambios([{"op": "agregar", "libro": libro.to_dict()}], diferir)
+            if not diferir:
+                self._persistir(pendiente)
+                pendiente = None
+        print(f"✅ Libro '{libro.titulo}' agregado")
+        return True, pendiente
 
     def agregar_libro(self, libro: Libro):
-        if any(l.id == libro.id for l in self.libros):
-            print(f"❌ Ya existe un libro con ID {libro.id}")
-            return False
-            
+        return self._agregar_libro(libro)[0]
+
+    async def agregar_libro_async(self, libro: Libro):
+        resultado, pendiente = self._agregar_libro(libro, diferir=True)
+        await self._persistir_async(pendiente)
+        return resultado
+
+    def importar_libros(self, origen, formato: Optional[str] = None, progreso_cada: int = 10000) -> int:
+        if not isinstance(origen, str):
+            return self._importar_libros(origen, progreso_cada)
+
+        formato = (formato or os.path.splitext(origen)[1].lstrip('.')).lower()
+        if formato not in LECTORES_LIBROS:
+            print(f"❌ Formato de importación inválido: {formato}")
+            return 0
+        try:
+            f = open(origen, newline='', encoding='utf-8')
+        except OSError as e:
+            print(f"❌ No se pudo abrir {origen}: {e}")
+            return 0
+        with f:
+            return self._importar_libros(LECTORES_LIBROS[formato](f), progreso_cada)
+
+    def _importar_libros(self, libros: Iterable[Optional[Libro]], progreso_cada: int) -> int:
+        with self._bloquear_libros(range(len(self._locks_libros))):
+            return self._importar_libros_bloqueado(libros, progreso_cada)
+
+    def _importar_libros_bloqueado(self, libros: Iterable[Optional[Libro]], progreso_cada: int) -> int:
+        inicio = time.perf_counter()
+        cambios = []
+        omitidos = 0
+        for procesados, libro in enumerate(libros, 1):
+            with self._lock_registro:
+                if libro is None:
+                    omitidos += 1
+                elif libro.id in self._indice_libros:
+                    print(f"❌ Ya existe un libro con ID {libro.id}")
+                    omitidos += 1
+                else:
+                    self.libros.append(libro)
+                    self._indice_libros[libro.id] = libro
+                    cambios.append({"op": "agregar", "libro": libro.to_dict()})
+            if progreso_cada and procesados % progreso_cada == 0:
+                ritmo = procesados / (time.perf_counter() - inicio)
+                print(f"⏳ {procesados} registros procesados ({ritmo:.0f} registros/s)")
+
+        with self._lock_registro:
+            if cambios:
+                self._indice_texto = None
+                self._indices_prefijos = {}
+                self._indice_stock = None
+            pendiente = self._anotar_cambios(cambios)
+        self._persistir(pendiente)
+
+        duracion = time.perf_counter() - inicio
+        ritmo = len(cambios) / duracion if duracion else 0
+        print(f"✅ {len(cambios)} libros importados, {omitidos} omitidos en {duracion:.2f}s ({ritmo:.0f} libros/s)")
+        return len(cambios)
+
+    def _indexar_libro(self, libro: Libro):
         self.libros.append(libro)
-        self.guardar_datos()
-        print(f"✅ Libro '{libro.titulo}' agregado")
-        return True
+        self._indice_libros[libro.id] = libro
+        if self._indice_texto is not None:
+            self._indice_texto.agregar(libro)
+        for indice in self._indices_prefijos.values():
+            indice.agregar(libro)
+        if self._indice_stock is not None:
+            self._indice_stock.agregar(libro)
+
+    def _ajustar_stock(self, libro: Libro, delta: int):
+        stock_anterior = libro.stock
+        libro.stock += delta
+        if self._indice_stock is not None:
+            self._indice_stock.actualizar(libro, stock_anterior)
+
+    def _obtener_indice_stock(self) -> IndiceStock:
+        if self._indice_stock is None:
+            self._indice_stock = IndiceStock(self.libros)
+        return self._indice_stock
+
+    def _registrar_prestamo(self, prestamo: Prestamo):
+        with self._lock_prestamos:
+            self.prestamos.append(prestamo)
+            self._prestamos_activos[(prestamo.libro_id, prestamo.usuario)] = prestamo
+            if self._tabla_prestamos is not None:
+                self._tabla_prestamos.agregar(prestamo)
+
+    def _cerrar_prestamo(self, libro_id: int, usuario: str) -> Prestamo:
+        with self._lock_prestamos:
+            prestamo = self._prestamos_activos.pop((libro_id, usuario))
+            prestamo.devuelto = True
+            if self._tabla_prestamos is not None:
+                self._tabla_prestamos.marcar_devuelto(libro_id, usuario)
+        return prestamo
+
+    def _obtener_tabla_prestamos(self) -> TablaPrestamos:
+        if self._tabla_prestamos is None:
+            self._tabla_prestamos = TablaPrestamos(self.prestamos)
+        return self._tabla_prestamos
+
+    def calcular_multas(self, hoy: Optional[date] = None) -> List[Tuple[Prestamo, float]]:
+        hoy = (hoy or datetime.now().date()).toordinal()
+        with self._lock_prestamos:
+            filas, multas = self._obtener_tabla_prestamos().calcular_multas(hoy)
+            return [(self.prestamos[f], m) for f, m in zip(filas, multas)]
+
+    def multas_por_usuario(self, hoy: Optional[date] = None) -> Dict[str, float]:
+        hoy = (hoy or datetime.now().date()).toordinal()
+        with self._lock_prestamos:
+            return self._obtener_tabla_prestamos().multas_por_usuario(hoy)
+
+    def libros_por_stock(self, minimo: Optional[int] = None, maximo: Optional[int] = None,
+                         limite: Optional[int] = None) -> List[Libro]:
+        with self._lock_registro:
+            ids = self._obtener_indice_stock().rango(minimo, maximo, limite)
+            return [self._indice_libros[i] for i in ids]
+
+    def _obtener_indice_texto(self) -> IndiceTexto:
+        if self._indice_texto is None:
+            indice = IndiceTexto()
+            for libro in self.libros:
+                indice.agregar(libro)
+            self._indice_texto = indice
+        return self._indice_texto
+
+    def autocompletar(self, prefijo: str, campo: str = "titulo", limite: int = 10) -> List[Libro]:
+        if campo not in ["titulo", "autor"]:
+            print(f"❌ Campo inválido: {campo}")
+            return []
+
+        with self._lock_registro:
+            indice = self._indices_prefijos.get(campo)
+            if indice is None:
+                indice = self._indices_prefijos[campo] = IndicePrefijos(campo, self.libros)
+            return [self._indice_libros[i] for i in indice.buscar(prefijo, limite)]
 
     def buscar_libro(self, criterio: str, valor: str) -> List[Libro]:
         criterio = criterio.lower()
-        if criterio not in ["id", "titulo", "autor", "stock"]:
+        if criterio not in ["id", "titulo", "autor", "stock", "texto"]:
             print(f"❌ Criterio inválido: {criterio}")
             return []
             
@@ -116,70 +1475,192 @@ class Biblioteca:
             if criterio in ["id", "stock"]:
                 valor = int(valor)
                 
+            if criterio == "id":
+                libro = self._indice_libros.get(valor)
+                return [libro] if libro else []
+                
+            if criterio == "texto":
+                with self._lock_registro:
+                    ids = self._obtener_indice_texto().buscar(valor)
+                    return [self._indice_libros[i] for i in sorted(ids)]
+                
+            if criterio == "stock":
+                return self.libros_por_stock(valor, valor)
+                
             return [l for l in self.libros if getattr(l, criterio) == valor]
         except ValueError:
             print(f"❌ Valor inválido para {criterio}: {valor}")
             return []
 
-    def prestar_libro(self, libro_id: int, usuario: str):
-        prestamo_activo = any(
-            p for p in self.prestamos 
-            if p.libro_id == libro_id 
-            and p.usuario == usuario 
-            and not p.devuelto
-        )
-        if prestamo_activo:
-            print(f"❌ {usuario} ya tiene prestado este libro")
-            return False
-            
-        libro = next((l for l in self.libros if l.id == libro_id), None)
-        if not libro:
-            print(f"❌ Libro con ID {libro_id} no encontrado")
-            return False
-            
-        if libro.stock <= 0:
-            print(f"❌ No hay existencias de '{libro.titulo}'")
-            return False
-            
-        libro.stock -= 1
-        prestamo = Prestamo(libro_id, usuario)
-        self.prestamos.append(prestamo)
-        self.guardar_datos()
+    async def buscar_libro_async(self, criterio: str, valor: str) -> List[Libro]:
+        if not self.concurrente or criterio.lower() == "id":
+            return self.buscar_libro(criterio, valor)
+        return await asyncio.get_running_loop().run_in_executor(None, self.buscar_libro, criterio, valor)
+
+    def _prestar_libro(self, libro_id: int, usuario: str, diferir: bool = False):
+        with self._bloquear_libros([libro_id]):
+            with self._lock_prestamos:
+                prestado = (libro_id, usuario) in self._prestamos_activos
+            if prestado:
+                print(f"❌ {usuario} ya tiene prestado este libro")
+                return False, None, None
+
+            libro = self._indice_libros.get(libro_id)
+            if not libro:
+                print(f"❌ Libro con ID {libro_id} no encontrado")
+                return False, None, None
+
+            if libro.stock <= 0:
+                print(f"❌ No hay existencias de '{libro.titulo}'")
+                return False, None, None
+
+            prestamo = Prestamo(libro_id, usuario)
+            with self._lock_registro:
+                self._ajustar_stock(libro, -1)
+                self._registrar_prestamo(prestamo)
+                pendiente = self._anotar_cambios([{"op": "prestar", **prestamo.to_dict()}], diferir)
+            if not diferir:
+                self._persistir(pendiente)
+                pendiente = None
 
         print(f"✅ Libro '{libro.titulo}' prestado a {usuario}. Devuelve antes del {prestamo.fecha_devolucion}")
         
      
         mensaje = f"¡No olvides devolver '{libro.titulo}' antes del {prestamo.fecha_devolucion}!"
-        asyncio.create_task(Notificador.enviar_notificacion(usuario, mensaje))
-        return True
+        return True, pendiente, mensaje
 
-    def devolver_libro(self, libro_id: int, usuario: str):
-        prestamo = next(
-            (p for p in self.prestamos 
-             if p.libro_id == libro_id 
-             and p.usuario == usuario 
-             and not p.devuelto),
-            None
-        )
-        if not prestamo:
-            print(f"❌ Préstamo no encontrado para {usuario}")
-            return False
-            
-        libro = next((l for l in self.libros if l.id == libro_id), None)
-        if not libro:
-            print(f"❌ Libro con ID {libro_id} no encontrado")
-            return False
-            
-        prestamo.devuelto = True
-        libro.stock += 1
-        self.guardar_datos()
+    def prestar_libro(self, libro_id: int, usuario: str):
+        resultado, _, mensaje = self._prestar_libro(libro_id, usuario)
+        if resultado:
+            self.notificaciones.encolar(usuario, mensaje)
+        return resultado
+
+    async def prestar_libro_async(self, libro_id: int, usuario: str):
+        resultado, pendiente, mensaje = self._prestar_libro(libro_id, usuario, diferir=True)
+        await self._persistir_async(pendiente)
+        if resultado:
+            await self.notificaciones.enviar(usuario, mensaje)
+        return resultado
+
+    def prestar_libros(self, pares: Iterable[Tuple[int, str]]) -> List[Dict]:
+        pares = [(libro_id, usuario) for libro_id, usuario in pares]
+        informe = []
+        prestamos = []
+        stock: Dict[int, int] = {}
+        nuevos: Set[Tuple[int, str]] = set()
+        lote: Dict[str, List[str]] = {}
+        with self._bloquear_libros(libro_id for libro_id, _ in pares):
+            with self._lock_prestamos:
+                prestados = {clave for clave in pares if clave in self._prestamos_activos}
+            for libro_id, usuario in pares:
+                clave = (libro_id, usuario)
+                libro = self._indice_libros.get(libro_id)
+                if clave in prestados or clave in nuevos:
+                    motivo = f"{usuario} ya tiene prestado este libro"
+                elif not libro:
+                    motivo = f"Libro con ID {libro_id} no encontrado"
+                elif stock.get(libro_id, libro.stock) <= 0:
+                    motivo = f"No hay existencias de '{libro.titulo}'"
+                else:
+                    stock[libro_id] = stock.get(libro_id, libro.stock) - 1
+                    nuevos.add(clave)
+                    prestamo = Prestamo(libro_id, usuario)
+                    prestamos.append(prestamo)
+                    informe.append({"libro_id": libro_id, "usuario": usuario, "exito": True,
+                                    "fecha_devolucion": str(prestamo.fecha_devolucion)})
+                    continue
+                print(f"❌ {motivo}")
+                informe.append({"libro_id": libro_id, "usuario": usuario, "exito": False, "motivo": motivo})
+
+            with self._lock_registro:
+                for prestamo in prestamos:
+                    libro = self._indice_libros[prestamo.libro_id]
+                    self._ajustar_stock(libro, -1)
+                    self._registrar_prestamo(prestamo)
+                    lote.setdefault(prestamo.usuario, []).append(
+                        f"¡No olvides devolver '{libro.titulo}' antes del {prestamo.fecha_devolucion}!"
+                    )
+                pendiente = self._anotar_cambios([{"op": "prestar", **p.to_dict()} for p in prestamos])
+            self._persistir(pendiente)
+
+        print(f"✅ {len(prestamos)} de {len(informe)} préstamos realizados")
+        self.notificaciones.encolar_lote(lote)
+        return informe
+
+    def devolver_libros(self, pares: Iterable[Tuple[int, str]]) -> List[Dict]:
+        pares = [(libro_id, usuario) for libro_id, usuario in pares]
+        informe = []
+        devueltos: Dict[Tuple[int, str], Libro] = {}
+        multa_total = 0.0
+        with self._bloquear_libros(libro_id for libro_id, _ in pares):
+            with self._lock_prestamos:
+                activos = {clave: self._prestamos_activos.get(clave) for clave in pares}
+            for libro_id, usuario in pares:
+                clave = (libro_id, usuario)
+                prestamo = activos[clave]
+                libro = self._indice_libros.get(libro_id)
+                if not prestamo or clave in devueltos:
+                    motivo = f"Préstamo no encontrado para {usuario}"
+                elif not libro:
+                    motivo = f"Libro con ID {libro_id} no encontrado"
+                else:
+                    devueltos[clave] = libro
+                    multa = prestamo.calcular_multa()
+                    multa_total += multa
+                    informe.append({"libro_id": libro_id, "usuario": usuario, "exito": True, "multa": multa})
+                    continue
+                print(f"❌ {motivo}")
+                informe.append({"libro_id": libro_id, "usuario": usuario, "exito": False, "motivo": motivo})
+
+            with self._lock_registro:
+                for (libro_id, usuario), libro in devueltos.items():
+                    self._cerrar_prestamo(libro_id, usuario)
+                    self._ajustar_stock(libro, 1)
+                pendiente = self._anotar_cambios([
+                    {"op": "devolver", "libro_id": libro_id, "usuario": usuario} for libro_id, usuario in devueltos
+                ])
+            self._persistir(pendiente)
+
+        print(f"✅ {len(devueltos)} de {len(informe)} libros devueltos")
+        if multa_total > 0:
+            print(f"⚠️ Multas por devoluciones tardías: ${multa_total:.2f}")
+        return informe
+
+    def _devolver_libro(self, libro_id: int, usuario: str, diferir: bool = False):
+        with self._bloquear_libros([libro_id]):
+            with self._lock_prestamos:
+                prestamo = self._prestamos_activos.get((libro_id, usuario))
+            if not prestamo:
+                print(f"❌ Préstamo no encontrado para {usuario}")
+                return False, None
+
+            libro = self._indice_libros.get(libro_id)
+            if not libro:
+                print(f"❌ Libro con ID {libro_id} no encontrado")
+                return False, None
+
+            with self._lock_registro:
+                self._cerrar_prestamo(libro_id, usuario)
+                self._ajustar_stock(libro, 1)
+                pendiente = self._anotar_cambios([{"op": "devolver", "libro_id": libro_id, "usuario": usuario}], diferir)
+            if not diferir:
+                self._persistir(pendiente)
+                pendiente = None
         
         multa = prestamo.calcular_multa()
         if multa > 0:
             print(f"⚠️ Devolución tardía. Multa a pagar: ${multa:.2f}")
         else:
             print(f"✅ Libro '{libro.titulo}' devuelto correctamente")
-        return True
+        return True, pendiente
+
+    def devolver_libro(self, libro_id: int, usuario: str):
+        return self._devolver_libro(libro_id, usuario)[0]
+
+    async def devolver_libro_async(self, libro_id: int, usuario: str):
+        resultado, pendiente = self._devolver_libro(libro_id, usuario, diferir=True)
+        await self._persistir_async(pendiente)
+        return resultado
 
     def listar_libros(self):
         if not self.libros:
@@ -191,20 +1672,285 @@ class Biblioteca:
             print(f"ID: {libro.id} | Título: {libro.titulo} | Autor: {libro.autor} | Stock: {libro.stock}")
 
     def listar_prestamos_activos(self):
-        activos = [p for p in self.prestamos if not p.devuelto]
+        with self._lock_prestamos:
+            activos = list(self._prestamos_activos.values())
         if not activos:
             print("📝 No hay préstamos activos")
             return
             
+        multas = dict(self.calcular_multas())
         print("\n📝 Préstamos Activos:")
         for prestamo in activos:
-            libro = next((l for l in self.libros if l.id == prestamo.libro_id), None)
+            libro = self._indice_libros.get(prestamo.libro_id)
             libro_titulo = libro.titulo if libro else "Libro Desconocido"
-            estado = "✅ En plazo" if datetime.now().date() <= prestamo.fecha_devolucion else f"⚠️ Atrasado (Multa: ${prestamo.calcular_multa():.2f})"
+            estado = "✅ En plazo" if prestamo not in multas else f"⚠️ Atrasado (Multa: ${multas[prestamo]:.2f})"
             print(f"Usuario: {prestamo.usuario} | Libro: {libro_titulo} | Devuelve: {prestamo.fecha_devolucion} | {estado}")
 
 
-def mostrar_menu():
+class BuzonNotificaciones:
+    def __init__(self):
+        self.mensajes: List[Tuple[str, str]] = []
+
+    def encolar(self, usuario: str, mensaje: str) -> bool:
+        self.mensajes.append((usuario, mensaje))
+        return True
+
+    def encolar_lote(self, lote: Dict[str, List[str]]) -> bool:
+        for usuario, mensajes in lote.items():
+            self.mensajes.extend((usuario, mensaje) for mensaje in mensajes)
+        return True
+
+    async def enviar(self, usuario: str, mensaje: str):
+        self.encolar(usuario, mensaje)
+
+    def pendientes(self) -> int:
+        return len(self.mensajes)
+
+    def vaciar(self) -> List[Tuple[str, str]]:
+        mensajes, self.mensajes = self.mensajes, []
+        return mensajes
+
+
+def ejecutar_fragmento(conexion, archivo: str, formato: str, opciones: Dict):
+    buzon = BuzonNotificaciones()
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        biblioteca = Biblioteca(archivo, formato=formato, notificaciones=buzon, **opciones)
+    conexion.send((None, None, salida.getvalue(), []))
+
+    while True:
+        mensaje = conexion.recv()
+        if mensaje is None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                biblioteca.flush()
+            conexion.close()
+            return
+
+        metodo, args, kwargs = mensaje
+        salida = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(salida):
+                resultado = getattr(biblioteca, metodo)(*args, **kwargs)
+        except Exception as e:
+            conexion.send((None, e, salida.getvalue(), buzon.vaciar()))
+        else:
+            conexion.send((resultado, None, salida.getvalue(), buzon.vaciar()))
+
+
+class BibliotecaFragmentada:
+    def __init__(self, fragmentos: Optional[int] = None, archivo: Optional[str] = None, formato: str = 'json',
+                 notificaciones: Optional[DespachadorNotificaciones] = None, **opciones):
+        if formato not in ALMACENAMIENTOS:
+            raise ValueError(f"Formato de persistencia inválido: {formato}")
+        self.fragmentos = fragmentos or os.cpu_count() or 1
+        base, extension = os.path.splitext(archivo or ALMACENAMIENTOS[formato][1])
+        self.archivos = [f"{base}.{i}{extension}" for i in range(self.fragmentos)]
+        self.notificaciones = notificaciones or DespachadorNotificaciones()
+
+        metodo = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        contexto = multiprocessing.get_context(metodo)
+        self._conexiones = []
+        self._procesos = []
+        for archivo_fragmento in self.archivos:
+            extremo, extremo_fragmento = contexto.Pipe()
+            proceso = contexto.Process(target=ejecutar_fragmento, daemon=True,
+                                       args=(extremo_fragmento, archivo_fragmento, formato, opciones))
+            proceso.start()
+            extremo_fragmento.close()
+            self._conexiones.append(extremo)
+            self._procesos.append(proceso)
+        self._locks = [threading.Lock() for _ in range(self.fragmentos)]
+        for i in range(self.fragmentos):
+            self._procesar_respuesta(self._conexiones[i].recv())
+
+    def fragmento(self, libro_id: int) -> int:
+        return libro_id % self.fragmentos
+
+    def _procesar_respuesta(self, respuesta: Tuple):
+        resultado, error, salida, mensajes = respuesta
+        if salida:
+            sys.stdout.write(salida)
+        if len(mensajes) == 1:
+            self.notificaciones.encolar(*mensajes[0])
+        elif mensajes:
+            lote: Dict[str, List[str]] = {}
+            for usuario, mensaje in mensajes:
+                lote.setdefault(usuario, []).append(mensaje)
+            self.notificaciones.encolar_lote(lote)
+        if error is not None:
+            raise error
+        return resultado
+
+    def _llamar(self, i: int, metodo: str, *args, **kwargs):
+        with self._locks[i]:
+            self._conexiones[i].send((metodo, args, kwargs))
+            respuesta = self._conexiones[i].recv()
+        return self._procesar_respuesta(respuesta)
+
+    def _difundir(self, metodo: str, argumentos: Optional[Dict[int, Tuple]] = None) -> Dict[int, object]:
+        destinos = range(self.fragmentos) if argumentos is None else sorted(argumentos)
+        with contextlib.ExitStack() as pila:
+            for i in destinos:
+                pila.enter_context(self._locks[i])
+            for i in destinos:
+                self._conexiones[i].send((metodo, argumentos[i] if argumentos else (), {}))
+            respuestas = {i: self._conexiones[i].recv() for i in destinos}
+
+        resultados = {}
+        error = None
+        for i in destinos:
+            try:
+                resultados[i] = self._procesar_respuesta(respuestas[i])
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return resultados
+
+    def _repartir(self, elementos: Iterable, clave) -> Dict[int, List]:
+        partes: Dict[int, List] = {}
+        for elemento in elementos:
+            partes.setdefault(self.fragmento(clave(elemento)), []).append(elemento)
+        return partes
+
+    def agregar_libro(self, libro: Libro):
+        return self._llamar(self.fragmento(libro.id), 'agregar_libro', libro)
+
+    def importar_libros(self, origen, formato: Optional[str] = None, progreso_cada: int = 0) -> int:
+        if isinstance(origen, str):
+            formato = (formato or os.path.splitext(origen)[1].lstrip('.')).lower()
+            if formato not in LECTORES_LIBROS:
+                print(f"❌ Formato de importación inválido: {formato}")
+                return 0
+            try:
+                f = open(origen, newline='', encoding='utf-8')
+            except OSError as e:
+                print(f"❌ No se pudo abrir {origen}: {e}")
+                return 0
+            with f:
+                libros = [libro for libro in LECTORES_LIBROS[formato](f) if libro is not None]
+        else:
+            libros = list(origen)
+
+        partes = self._repartir(libros, lambda libro: libro.id)
+        resultados = self._difundir('importar_libros', {i: (parte, None, progreso_cada) for i, parte in partes.items()})
+        return sum(resultados.values())
+
+    def prestar_libro(self, libro_id: int, usuario: str):
+        return self._llamar(self.fragmento(libro_id), 'prestar_libro', libro_id, usuario)
+
+    def devolver_libro(self, libro_id: int, usuario: str):
+        return self._llamar(self.fragmento(libro_id), 'devolver_libro', libro_id, usuario)
+
+    def _operar_lote(self, metodo: str, pares: Iterable[Tuple[int, str]]) -> List[Dict]:
+        pares = list(pares)
+        posiciones = self._repartir(range(len(pares)), lambda posicion: pares[posicion][0])
+        resultados = self._difundir(metodo, {
+            i: ([pares[posicion] for posicion in parte],) for i, parte in posiciones.items()
+        })
+        informe: List[Dict] = [{}] * len(pares)
+        for i, parte in posiciones.items():
+            for posicion, resultado in zip(parte, resultados[i]):
+                informe[posicion] = resultado
+        return informe
+
+    def prestar_libros(self, pares: Iterable[Tuple[int, str]]) -> List[Dict]:
+        return self._operar_lote('prestar_libros', pares)
+
+    def devolver_libros(self, pares: Iterable[Tuple[int, str]]) -> List[Dict]:
+        return self._operar_lote('devolver_libros', pares)
+
+    def buscar_libro(self, criterio: str, valor: str) -> List[Libro]:
+        if criterio.lower() not in ["id", "titulo", "autor", "stock", "texto"]:
+            print(f"❌ Criterio inválido: {criterio}")
+            return []
+
+        if criterio.lower() == "id":
+            try:
+                libro_id = int(valor)
+            except ValueError:
+                print(f"❌ Valor inválido para id: {valor}")
+                return []
+            return self._llamar(self.fragmento(libro_id), 'buscar_libro', criterio, valor)
+
+        resultados = self._difundir('buscar_libro', {i: (criterio, valor) for i in range(self.fragmentos)})
+        return sorted((libro for libros in resultados.values() for libro in libros), key=lambda libro: libro.id)
+
+    def multas_por_usuario(self, hoy: Optional[date] = None) -> Dict[str, float]:
+        totales: Dict[str, float] = {}
+        for multas in self._difundir('multas_por_usuario', {i: (hoy,) for i in range(self.fragmentos)}).values():
+            for usuario, multa in multas.items():
+                totales[usuario] = totales.get(usuario, 0.0) + multa
+        return totales
+
+    def flush(self):
+        self._difundir('flush')
+
+    def guardar_datos(self):
+        self._difundir('guardar_datos')
+
+    def cerrar(self):
+        for conexion, lock in zip(self._conexiones, self._locks):
+            with lock:
+                conexion.send(None)
+        for conexion, proceso in zip(self._conexiones, self._procesos):
+            proceso.join()
+            conexion.close()
+        self._conexiones = []
+        self._procesos = []
+
+    def __enter__(self) -> 'BibliotecaFragmentada':
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+_ENTRADA_PENDIENTE = bytearray()
+
+
+def _leer_linea() -> str:
+    while b'\n' not in _ENTRADA_PENDIENTE:
+        bloque = os.read(sys.stdin.fileno(), 4096)
+        if not bloque:
+            if not _ENTRADA_PENDIENTE:
+                raise EOFError
+            break
+        _ENTRADA_PENDIENTE.extend(bloque)
+    fin = _ENTRADA_PENDIENTE.find(b'\n') + 1 or len(_ENTRADA_PENDIENTE)
+    linea = bytes(_ENTRADA_PENDIENTE[:fin])
+    del _ENTRADA_PENDIENTE[:fin]
+    return linea.decode(sys.stdin.encoding or 'utf-8', errors='replace').rstrip('\r\n')
+
+
+def _completar_entrada(futuro: asyncio.Future, linea: Optional[str], error: Optional[BaseException]):
+    if futuro.done():
+        return
+    if error is not None:
+        futuro.set_exception(error)
+    else:
+        futuro.set_result(linea)
+
+
+async def leer_entrada(mensaje: str) -> str:
+    loop = asyncio.get_running_loop()
+    futuro = loop.create_future()
+
+    def leer():
+        linea, error = None, None
+        try:
+            linea = _leer_linea()
+        except Exception as e:
+            error = e
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(_completar_entrada, futuro, linea, error)
+
+    print(mensaje, end='', flush=True)
+    threading.Thread(target=leer, name='entrada', daemon=True).start()
+    return await futuro
+
+
+async def mostrar_menu():
     print("\n📚 ** SISTEMA DE BIBLIOTECA **")
     print("1. Agregar libro")
     print("2. Listar todos los libros")
@@ -213,22 +1959,22 @@ def mostrar_menu():
     print("5. Devolver libro")
     print("6. Listar préstamos activos")
     print("7. Salir")
-    return input("Seleccione una opción: ")
+    return await leer_entrada("Seleccione una opción: ")
 
 async def main():
     biblioteca = Biblioteca()
     
     while True:
-        opcion = mostrar_menu()
+        opcion = await mostrar_menu()
         
         if opcion == "1":
             try:
-                id = int(input("ID del libro: "))
-                titulo = input("Título: ")
-                autor = input("Autor: ")
-                stock = int(input("Stock inicial: "))
+                id = int(await leer_entrada("ID del libro: "))
+                titulo = await leer_entrada("Título: ")
+                autor = await leer_entrada("Autor: ")
+                stock = int(await leer_entrada("Stock inicial: "))
                 libro = Libro(id, titulo, autor, stock)
-                biblioteca.agregar_libro(libro)
+                await biblioteca.agregar_libro_async(libro)
             except ValueError:
                 print("❌ Error: ID y Stock deben ser números enteros")
                 
@@ -241,12 +1987,13 @@ async def main():
             print("2. Título")
             print("3. Autor")
             print("4. Stock")
-            subopcion = input("Seleccione criterio: ")
+            print("5. Palabras del título o autor")
+            subopcion = await leer_entrada("Seleccione criterio: ")
             
-            criterios = {"1": "id", "2": "titulo", "3": "autor", "4": "stock"}
+            criterios = {"1": "id", "2": "titulo", "3": "autor", "4": "stock", "5": "texto"}
             if subopcion in criterios:
-                valor = input(f"Ingrese {criterios[subopcion]}: ")
-                libros = biblioteca.buscar_libro(criterios[subopcion], valor)
+                valor = await leer_entrada(f"Ingrese {criterios[subopcion]}: ")
+                libros = await biblioteca.buscar_libro_async(criterios[subopcion], valor)
                 if libros:
                     print("\n🔍 Resultados de la búsqueda:")
                     for libro in libros:
@@ -258,17 +2005,17 @@ async def main():
                 
         elif opcion == "4":
             try:
-                libro_id = int(input("ID del libro a prestar: "))
-                usuario = input("Nombre de usuario: ")
-                biblioteca.prestar_libro(libro_id, usuario)
+                libro_id = int(await leer_entrada("ID del libro a prestar: "))
+                usuario = await leer_entrada("Nombre de usuario: ")
+                await biblioteca.prestar_libro_async(libro_id, usuario)
             except ValueError:
                 print("❌ Error: ID debe ser un número entero")
                 
         elif opcion == "5":
             try:
-                libro_id = int(input("ID del libro a devolver: "))
-                usuario = input("Nombre de usuario: ")
-                biblioteca.devolver_libro(libro_id, usuario)
+                libro_id = int(await leer_entrada("ID del libro a devolver: "))
+                usuario = await leer_entrada("Nombre de usuario: ")
+                await biblioteca.devolver_libro_async(libro_id, usuario)
             except ValueError:
                 print("❌ Error: ID debe ser un número entero")
                 
@@ -276,15 +2023,21 @@ async def main():
             biblioteca.listar_prestamos_activos()
                 
         elif opcion == "7":
+            biblioteca.flush()
+            if biblioteca.notificaciones.pendientes():
+                print("📧 Enviando notificaciones pendientes...")
+            await biblioteca.notificaciones.cerrar()
             print("¡Hasta pronto! 👋")
             break
             
         else:
             print("❌ Opción inválida")
-        
-        
-        await asyncio.sleep(0.1)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if len(sys.argv) == 4 and sys.argv[1] == "--convertir-binario":
+        convertir_json_a_binario(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == "--importar":
+        Biblioteca().importar_libros(sys.argv[2])
+    else:
+        asyncio.run(main())
\ No newline at end of file
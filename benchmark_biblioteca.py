@@ -0,0 +1,844 @@
+import gc
+import io
+import os
+import sys
+import json
+import time
+import signal
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import tracemalloc
+import multiprocessing
+import importlib.util
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+def cargar_gestor():
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Gestor-Biblioteca.py')
+    spec = importlib.util.spec_from_file_location('gestor_biblioteca', ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+gestor = cargar_gestor()
+
+
+class LibroConDict:
+    def __init__(self, id, titulo, autor, stock):
+        self.id = id
+        self.titulo = titulo
+        self.autor = autor
+        self.stock = stock
+
+
+class PrestamoConDict:
+    def __init__(self, libro_id, usuario, fecha_prestamo, fecha_devolucion):
+        self.libro_id = libro_id
+        self.usuario = usuario
+        self.fecha_prestamo = fecha_prestamo
+        self.fecha_devolucion = fecha_devolucion
+        self.devuelto = False
+
+
+def medir_memoria(construir) -> int:
+    gc.collect()
+    tracemalloc.start()
+    objetos = construir()
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objetos
+    return memoria
+
+
+def benchmark_memoria(num_libros: int = 100_000, num_prestamos: int = 500_000, num_usuarios: int = 5_000):
+    inicio = date(2024, 1, 1)
+
+    def libros_con_dict():
+        return [LibroConDict(i, f"Titulo {i}", f"Autor {i % 1000}", i % 7) for i in range(num_libros)]
+
+    def libros_compactos():
+        return [gestor.Libro(i, f"Titulo {i}", f"Autor {i % 1000}", i % 7) for i in range(num_libros)]
+
+    def prestamos_con_dict():
+        prestamos = []
+        for i in range(num_prestamos):
+            fecha = inicio + timedelta(days=i % 700)
+            prestamos.append(PrestamoConDict(i % num_libros, f"usuario{i % num_usuarios}", fecha, fecha + timedelta(days=14)))
+        return prestamos
+
+    def prestamos_compactos():
+        prestamos = []
+        for i in range(num_prestamos):
+            fecha = inicio + timedelta(days=i % 700)
+            prestamo = gestor.Prestamo(i % num_libros, f"usuario{i % num_usuarios}")
+            prestamo.fecha_prestamo = fecha
+            prestamo.fecha_devolucion = fecha + timedelta(days=14)
+            prestamos.append(prestamo)
+        return prestamos
+
+    print(f"\n🧠 Memoria ({num_libros} libros, {num_prestamos} préstamos, {num_usuarios} usuarios)")
+    for nombre, anterior, compacto, cantidad in [
+        ("Libro", libros_con_dict, libros_compactos, num_libros),
+        ("Prestamo", prestamos_con_dict, prestamos_compactos, num_prestamos),
+    ]:
+        bytes_anterior = medir_memoria(anterior)
+        bytes_compacto = medir_memoria(compacto)
+        ahorro = 100 * (1 - bytes_compacto / bytes_anterior)
+        print(f"{nombre}: {bytes_anterior / cantidad:.0f} B/objeto con __dict__ | "
+              f"{bytes_compacto / cantidad:.0f} B/objeto compacto | ahorro {ahorro:.0f}%")
+
+
+def benchmark_multas(num_prestamos: int = 1_000_000, num_usuarios: int = 50_000):
+    hoy = date.today()
+    prestamos = []
+    for i in range(num_prestamos):
+        prestamo = gestor.Prestamo(i, f"usuario{i % num_usuarios}")
+        prestamo.fecha_devolucion = hoy - timedelta(days=i % 60 - 30)
+        prestamos.append(prestamo)
+
+    inicio = time.perf_counter()
+    total_bucle = sum(p.calcular_multa() for p in prestamos)
+    tiempo_bucle = time.perf_counter() - inicio
+
+    tabla = gestor.TablaPrestamos(prestamos)
+    inicio = time.perf_counter()
+    _, multas = tabla.calcular_multas(hoy.toordinal())
+    tiempo_tabla = time.perf_counter() - inicio
+
+    motor = "NumPy" if gestor.np is not None else "Python puro"
+    print(f"\n💰 Multas ({num_prestamos} préstamos activos, {motor})")
+    print(f"calcular_multa en bucle: {tiempo_bucle * 1000:.1f} ms (total ${total_bucle:.2f})")
+    print(f"TablaPrestamos.calcular_multas: {tiempo_tabla * 1000:.1f} ms (total ${sum(multas):.2f})")
+
+
+def generar_snapshot(ruta: str, num_libros: int, num_prestamos: int, num_usuarios: int):
+    inicio = date(2020, 1, 1)
+    data = {
+        "secuencia": 0,
+        "libros": [
+            {"id": i, "titulo": f"Titulo {i}", "autor": f"Autor {i % 1000}", "stock": i % 7}
+            for i in range(num_libros)
+        ],
+        "prestamos": [
+            {
+                "libro_id": i % num_libros,
+                "usuario": f"usuario{i % num_usuarios}",
+                "fecha_prestamo": (inicio + timedelta(days=i % 2000)).strftime('%Y-%m-%d'),
+                "fecha_devolucion": (inicio + timedelta(days=i % 2000 + 14)).strftime('%Y-%m-%d'),
+                "devuelto": i % 10 != 0
+            }
+            for i in range(num_prestamos)
+        ]
+    }
+    with open(ruta, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def cargar_con_json_load(ruta: str):
+    with open(ruta, 'r') as f:
+        data = json.load(f)
+    libros = [gestor.Libro(l['id'], l['titulo'], l['autor'], l['stock']) for l in data.get('libros', [])]
+    prestamos = []
+    for p in data.get('prestamos', []):
+        prestamo = gestor.Prestamo(p['libro_id'], p['usuario'])
+        prestamo.fecha_prestamo = datetime.strptime(p['fecha_prestamo'], '%Y-%m-%d').date()
+        prestamo.fecha_devolucion = datetime.strptime(p['fecha_devolucion'], '%Y-%m-%d').date()
+        prestamo.devuelto = p['devuelto']
+        prestamos.append(prestamo)
+    return libros, prestamos
+
+
+def cargar_con_biblioteca(ruta: str):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return gestor.Biblioteca(ruta)
+
+
+def medir_carga(cargar, ruta: str) -> Tuple[float, int]:
+    gc.collect()
+    inicio = time.perf_counter()
+    resultado = cargar(ruta)
+    tiempo = time.perf_counter() - inicio
+    del resultado
+
+    gc.collect()
+    tracemalloc.start()
+    resultado = cargar(ruta)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return tiempo, pico
+
+
+def benchmark_fechas(num_fechas: int = 1_000_000):
+    inicio = date(2020, 1, 1)
+    textos = [(inicio + timedelta(days=i % 2000)).strftime('%Y-%m-%d') for i in range(num_fechas)]
+    gestor.ordinal_desde_texto.cache_clear()
+
+    print(f"\n📅 Decodificación de fechas ({num_fechas} textos, 2000 distintos)")
+    for nombre, decodificar in [
+        ("datetime.strptime", lambda t: datetime.strptime(t, '%Y-%m-%d').date().toordinal()),
+        ("date.fromisoformat", lambda t: date.fromisoformat(t).toordinal()),
+        ("ordinal_desde_texto (memoizado)", gestor.ordinal_desde_texto),
+    ]:
+        inicio_medicion = time.perf_counter()
+        for texto in textos:
+            decodificar(texto)
+        print(f"{nombre}: {(time.perf_counter() - inicio_medicion) * 1000:.0f} ms")
+
+
+def benchmark_carga(num_libros: int = 50_000, num_prestamos: int = 250_000, num_usuarios: int = 5_000):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'biblioteca.json')
+        generar_snapshot(ruta, num_libros, num_prestamos, num_usuarios)
+        tamano = os.path.getsize(ruta) / 2**20
+
+        print(f"\n📂 Carga de biblioteca.json ({tamano:.0f} MiB, {num_libros} libros, {num_prestamos} préstamos)")
+        for nombre, cargar in [
+            ("json.load + objetos", cargar_con_json_load),
+            ("Biblioteca (incremental)", cargar_con_biblioteca),
+        ]:
+            tiempo, pico = medir_carga(cargar, ruta)
+            print(f"{nombre}: {tiempo:.2f} s | pico de memoria {pico / 2**20:.0f} MiB")
+
+
+def benchmark_formatos(num_libros: int = 50_000, num_prestamos: int = 250_000, num_usuarios: int = 5_000):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, 'biblioteca.json')
+        ruta_binaria = os.path.join(directorio, 'biblioteca.bin')
+        generar_snapshot(ruta_json, num_libros, num_prestamos, num_usuarios)
+        with contextlib.redirect_stdout(io.StringIO()):
+            gestor.convertir_json_a_binario(ruta_json, ruta_binaria)
+
+        print(f"\n💾 Formatos de snapshot ({num_libros} libros, {num_prestamos} préstamos)")
+        for formato, ruta in [("json", ruta_json), ("binario", ruta_binaria)]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                inicio = time.perf_counter()
+                biblioteca = gestor.Biblioteca(ruta, formato=formato)
+                tiempo_carga = time.perf_counter() - inicio
+
+                inicio = time.perf_counter()
+                biblioteca.guardar_datos()
+                tiempo_guardado = time.perf_counter() - inicio
+
+            tamano = os.path.getsize(ruta) / 2**20
+            print(f"{formato}: carga {tiempo_carga:.2f} s | guardado {tiempo_guardado:.2f} s | {tamano:.1f} MiB")
+
+
+def benchmark_catalogo(num_libros: int = 500_000):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, 'biblioteca.json')
+        ruta_catalogo = os.path.join(directorio, 'catalogo.cat')
+        generar_snapshot(ruta_json, num_libros, 0, 1)
+
+        print(f"\n🗺️ Arranque con catálogo de {num_libros} libros")
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            biblioteca = gestor.Biblioteca(ruta_json)
+            tiempo_json = time.perf_counter() - inicio
+            biblioteca.generar_catalogo_mapeado(ruta_catalogo)
+
+            inicio = time.perf_counter()
+            biblioteca = gestor.Biblioteca(ruta_json, catalogo=ruta_catalogo)
+            tiempo_mapeado = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            for libro_id in range(0, num_libros, num_libros // 1000):
+                biblioteca.buscar_libro("id", str(libro_id))
+            tiempo_consultas = time.perf_counter() - inicio
+
+        print(f"snapshot JSON completo: {tiempo_json * 1000:.0f} ms")
+        print(f"catálogo mapeado: {tiempo_mapeado * 1000:.1f} ms "
+              f"(1000 consultas por ID en frío: {tiempo_consultas * 1000:.1f} ms)")
+
+
+def benchmark_fsync(num_libros: int = 2_000, num_escrituras: int = 200):
+    print(f"\n🔒 Políticas de fsync ({num_libros} libros, {num_escrituras} altas por prueba)")
+    for journal in [False, True]:
+        for politica in gestor.PoliticaFsync.MODOS:
+            with tempfile.TemporaryDirectory() as directorio:
+                ruta = os.path.join(directorio, 'biblioteca.json')
+                generar_snapshot(ruta, num_libros, 0, 1)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    biblioteca = gestor.Biblioteca(ruta, journal=journal, fsync=politica)
+                    inicio = time.perf_counter()
+                    for i in range(num_escrituras):
+                        biblioteca.agregar_libro(gestor.Libro(num_libros + i, "Nuevo", "Autor", 1))
+                    tiempo = time.perf_counter() - inicio
+            modo = "journal" if journal else "snapshot"
+            print(f"{modo} / {politica}: {tiempo / num_escrituras * 1000:.2f} ms por escritura")
+
+
+def preparar_almacenamiento(directorio: str, formato: str, num_libros: int, num_prestamos: int,
+                            num_usuarios: int) -> str:
+    ruta_json = os.path.join(directorio, 'biblioteca.json')
+    generar_snapshot(ruta_json, num_libros, num_prestamos, num_usuarios)
+    if formato == 'json':
+        return ruta_json
+
+    ruta = os.path.join(directorio, gestor.ALMACENAMIENTOS[formato][1])
+    secuencia, libros, prestamos = gestor.AlmacenamientoJSON(ruta_json).leer()
+    almacenamiento = gestor.ALMACENAMIENTOS[formato][0](ruta)
+    if almacenamiento.incremental:
+        cambios = []
+        for prestamo in prestamos:
+            cambios.append({"op": "prestar", **prestamo.to_dict()})
+            if prestamo.devuelto:
+                cambios.append({"op": "devolver", "libro_id": prestamo.libro_id, "usuario": prestamo.usuario})
+        almacenamiento.registrar_lote(cambios)
+    almacenamiento.escribir(almacenamiento.capturar(secuencia, libros, prestamos))
+    return ruta
+
+
+def percentil(ordenados: List[float], porcentaje: float) -> float:
+    return ordenados[min(len(ordenados) - 1, round(porcentaje / 100 * (len(ordenados) - 1)))]
+
+
+def resumir_tiempos(tiempos: List[float], total: float) -> Dict:
+    ordenados = sorted(tiempos)
+    return {
+        "operaciones": len(tiempos),
+        "total_s": total,
+        "por_segundo": len(tiempos) / total if total else 0.0,
+        "media_ms": sum(tiempos) / len(tiempos) * 1000,
+        "p50_ms": percentil(ordenados, 50) * 1000,
+        "p90_ms": percentil(ordenados, 90) * 1000,
+        "p99_ms": percentil(ordenados, 99) * 1000,
+        "max_ms": ordenados[-1] * 1000,
+    }
+
+
+def medir_operacion(operacion, argumentos: List[Tuple]) -> Dict:
+    tiempos = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio_total = time.perf_counter()
+        for args in argumentos:
+            inicio = time.perf_counter()
+            operacion(*args)
+            tiempos.append(time.perf_counter() - inicio)
+        total = time.perf_counter() - inicio_total
+    return resumir_tiempos(tiempos, total)
+
+
+def benchmark_operaciones(num_libros: int = 20_000, num_usuarios: int = 2_000, num_prestamos: int = 100_000,
+                          repeticiones: int = 500, repeticiones_persistencia: int = 5, formato: str = 'json',
+                          journal: bool = True, semilla: int = 0, salida: Optional[str] = None,
+                          comparar: Optional[str] = None) -> Dict:
+    azar = random.Random(semilla)
+    resultados = {}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = preparar_almacenamiento(directorio, formato, num_libros, num_prestamos, num_usuarios)
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca = gestor.Biblioteca(ruta, formato=formato, journal=journal)
+
+        ids = [(azar.randrange(num_libros),) for _ in range(repeticiones)]
+        pares = [(libro_id, f"benchmark{i}") for i, (libro_id,) in enumerate(ids)]
+        operaciones = [
+            ("agregar_libro", biblioteca.agregar_libro,
+             [(gestor.Libro(num_libros + i, f"Nuevo {i}", f"Autor {i % 1000}", 3),) for i in range(repeticiones)]),
+            ("buscar_libro id", biblioteca.buscar_libro, [("id", str(libro_id)) for libro_id, in ids]),
+            ("buscar_libro titulo", biblioteca.buscar_libro, [("titulo", f"Titulo {libro_id}") for libro_id, in ids]),
+            ("buscar_libro texto", biblioteca.buscar_libro, [("texto", f"autor {libro_id % 1000}") for libro_id, in ids]),
+            ("prestar_libro", biblioteca.prestar_libro, pares),
+            ("devolver_libro", biblioteca.devolver_libro, pares),
+            ("guardar_datos", biblioteca.guardar_datos, [()] * repeticiones_persistencia),
+            ("cargar_datos", biblioteca.cargar_datos, [()] * repeticiones_persistencia),
+        ]
+
+        print(f"\n⏱️ Operaciones ({num_libros} libros, {num_usuarios} usuarios, {num_prestamos} préstamos, "
+              f"formato {formato}{', journal' if journal else ''})")
+        for nombre, operacion, argumentos in operaciones:
+            resultado = resultados[nombre] = medir_operacion(operacion, argumentos)
+            print(f"{nombre:<20} {resultado['operaciones']:>6} ops | {resultado['por_segundo']:>10.0f} ops/s | "
+                  f"p50 {resultado['p50_ms']:.3f} ms | p90 {resultado['p90_ms']:.3f} ms | "
+                  f"p99 {resultado['p99_ms']:.3f} ms | max {resultado['max_ms']:.3f} ms")
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec='seconds'),
+        "python": sys.version.split()[0],
+        "numpy": gestor.np is not None,
+        "parametros": {
+            "num_libros": num_libros, "num_usuarios": num_usuarios, "num_prestamos": num_prestamos,
+            "repeticiones": repeticiones, "repeticiones_persistencia": repeticiones_persistencia,
+            "formato": formato, "journal": journal, "semilla": semilla,
+        },
+        "operaciones": resultados,
+    }
+    if comparar:
+        comparar_resultados(comparar, informe)
+    if salida:
+        with open(salida, 'w') as f:
+            json.dump(informe, f, indent=2)
+        print(f"💾 Resultados guardados en {salida}")
+    return informe
+
+
+def operar_en_hilos(biblioteca, num_libros: int, hilos: int, operaciones: int) -> float:
+    def trabajar(hilo: int):
+        for i in range(operaciones):
+            libro_id, usuario = (hilo + i * hilos) % num_libros, f"usuario{hilo}"
+            biblioteca.prestar_libro(libro_id, usuario)
+            biblioteca.devolver_libro(libro_id, usuario)
+
+    trabajadores = [threading.Thread(target=trabajar, args=(hilo,)) for hilo in range(hilos)]
+    inicio = time.perf_counter()
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    return time.perf_counter() - inicio
+
+
+def benchmark_fragmentos(num_libros: int = 2_000, operaciones: int = 2_000, fragmentos: Optional[int] = None):
+    fragmentos = fragmentos or os.cpu_count() or 1
+    print(f"\n🧩 Fragmentos ({fragmentos} procesos, {os.cpu_count()} CPUs, {operaciones} préstamos en total)")
+    with tempfile.TemporaryDirectory() as directorio:
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca = gestor.BibliotecaFragmentada(fragmentos, os.path.join(directorio, 'biblioteca.json'),
+                                                      journal=True)
+            biblioteca.importar_libros([gestor.Libro(i, f"Titulo {i}", "Autor", 1) for i in range(num_libros)])
+        with biblioteca:
+            for hilos in sorted({1, fragmentos, 2 * fragmentos}):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tiempo = operar_en_hilos(biblioteca, num_libros, hilos, operaciones // hilos)
+                total = (operaciones // hilos) * hilos * 2
+                print(f"{hilos} hilos: {total / tiempo:,.0f} operaciones/s")
+
+
+def comparar_resultados(ruta_anterior: str, actual: Dict):
+    with open(ruta_anterior, 'r') as f:
+        anterior = json.load(f)
+
+    print(f"\n📊 Comparación con {ruta_anterior} ({anterior['fecha']})")
+    for nombre, resultado in actual['operaciones'].items():
+        previo = anterior['operaciones'].get(nombre)
+        if previo is None:
+            print(f"{nombre:<20} sin datos previos")
+            continue
+        cambios = []
+        for clave in ("p50_ms", "p99_ms"):
+            variacion = 100 * (resultado[clave] / previo[clave] - 1) if previo[clave] else 0.0
+            cambios.append(f"{clave[:-3]} {previo[clave]:.3f} → {resultado[clave]:.3f} ms ({variacion:+.0f}%)")
+        print(f"{nombre:<20} " + " | ".join(cambios))
+
+
+def estado_biblioteca(biblioteca) -> Tuple[List[Tuple[int, int]], List[Tuple[int, str]]]:
+    return [(libro.id, libro.stock) for libro in biblioteca.libros], sorted(biblioteca._prestamos_activos)
+
+
+def abrir_biblioteca(ruta: str, formato: str, **opciones):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return gestor.Biblioteca(ruta, formato=formato, **opciones)
+
+
+def comprobar(condicion: bool, mensaje: str) -> bool:
+    print(f"{'✅' if condicion else '❌'} {mensaje}")
+    return condicion
+
+
+def operar_hasta_morir(ruta: str, formato: str, num_libros: int):
+    biblioteca = abrir_biblioteca(ruta, formato, journal=True, compactar_cada=50)
+    with contextlib.redirect_stdout(io.StringIO()):
+        i = 0
+        while True:
+            libro_id, usuario = i % num_libros, f"usuario{i // num_libros % 3}"
+            if not biblioteca.prestar_libro(libro_id, usuario):
+                biblioteca.devolver_libro(libro_id, usuario)
+            i += 1
+
+
+def verificar_journal(formato: str, num_libros: int = 50, muertes: int = 5) -> bool:
+    correcto = True
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, gestor.ALMACENAMIENTOS[formato][1])
+        biblioteca = abrir_biblioteca(ruta, formato, journal=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca.importar_libros([gestor.Libro(i, f"Titulo {i}", "Autor", 2) for i in range(num_libros)])
+        biblioteca.guardar_datos()
+        inicial = dict(estado_biblioteca(biblioteca)[0])
+
+        contexto = multiprocessing.get_context('fork')
+        azar = random.Random(0)
+        for _ in range(muertes):
+            proceso = contexto.Process(target=operar_hasta_morir, args=(ruta, formato, num_libros))
+            proceso.start()
+            time.sleep(azar.uniform(0.2, 0.6))
+            os.kill(proceso.pid, signal.SIGKILL)
+            proceso.join()
+
+            libros, activos = estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True))
+            prestados: Dict[int, int] = {}
+            for libro_id, _ in activos:
+                prestados[libro_id] = prestados.get(libro_id, 0) + 1
+            conservado = all(stock >= 0 and stock + prestados.get(libro_id, 0) == inicial[libro_id]
+                             for libro_id, stock in libros)
+            correcto &= comprobar(conservado, f"{formato}: estado coherente tras matar el proceso con SIGKILL")
+
+        ruta_journal = ruta + '.log'
+        biblioteca = abrir_biblioteca(ruta, formato, journal=True, compactar_cada=10**9)
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca.prestar_libro(0, "ana")
+            biblioteca.prestar_libro(1, "ana")
+        esperado = estado_biblioteca(biblioteca)
+        tamano = os.path.getsize(ruta_journal)
+        for cola in (b'{"op":"devolver","libro_id":0,"usu', b'{"op":"devolver","libro_id":0,"usuario":"ana","seq":999999}'):
+            with open(ruta_journal, 'ab') as f:
+                f.write(cola)
+            recargada = abrir_biblioteca(ruta, formato, journal=True, compactar_cada=10**9)
+            correcto &= comprobar(
+                estado_biblioteca(recargada) == esperado and os.path.getsize(ruta_journal) == tamano,
+                f"{formato}: registro cortado al final del journal descartado y truncado"
+            )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            recargada.devolver_libro(1, "ana")
+        esperado = estado_biblioteca(recargada)
+        correcto &= comprobar(
+            estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True)) == esperado,
+            f"{formato}: los registros añadidos tras truncar se reproducen"
+        )
+
+        with open(ruta_journal, 'rb') as f:
+            journal_anterior = f.read()
+        recargada.guardar_datos()
+        correcto &= comprobar(os.path.getsize(ruta_journal) == 0, f"{formato}: el snapshot vacía el journal que cubre")
+        with open(ruta_journal, 'wb') as f:
+            f.write(journal_anterior)
+        correcto &= comprobar(
+            estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True)) == esperado,
+            f"{formato}: registros con seq <= snapshot ignorados (caída antes de truncar)"
+        )
+
+        biblioteca = abrir_biblioteca(ruta, formato, journal=True, compactar_cada=10**9)
+        captura = biblioteca._snapshot()
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca.agregar_libro(gestor.Libro(num_libros, "Titulo nuevo", "Autor", 1))
+        biblioteca._escribir_pendientes(captura)
+        correcto &= comprobar(
+            os.path.getsize(ruta_journal) > 0
+            and estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True)) == estado_biblioteca(biblioteca),
+            f"{formato}: un snapshot anterior al journal no lo trunca"
+        )
+
+        registros = [biblioteca._registros_journal]
+        for _ in range(3):
+            with contextlib.redirect_stdout(io.StringIO()):
+                biblioteca.cargar_datos()
+            registros.append(biblioteca._registros_journal)
+        with open(ruta_journal, 'rb') as f:
+            lineas = f.read().count(b'\n')
+        correcto &= comprobar(registros == [lineas] * 4,
+                              f"{formato}: recargar no acumula el contador de registros del journal")
+
+        esperado = estado_biblioteca(biblioteca)
+        tamano = os.path.getsize(ruta_journal)
+        with open(ruta_journal, 'a') as f:
+            f.write(json.dumps({"op": "devolver", "libro_id": 10**6, "usuario": "nadie", "seq": 10**6}) + '\n')
+        recargada = abrir_biblioteca(ruta, formato, journal=True, compactar_cada=10**9)
+        correcto &= comprobar(
+            estado_biblioteca(recargada) == esperado and os.path.getsize(ruta_journal) == tamano
+            and os.path.exists(ruta_journal + '.corrupto'),
+            f"{formato}: un registro sobre un libro desconocido detiene la reproducción sin fallar"
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            recargada.agregar_libro(gestor.Libro(num_libros + 1, "Otro titulo", "Autor", 1))
+        correcto &= comprobar(
+            estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True)) == estado_biblioteca(recargada),
+            f"{formato}: los registros añadidos tras descartar el journal se reproducen"
+        )
+
+        with open(ruta, 'wb') as f:
+            f.write(b'{"libros": [{"id"')
+        try:
+            arranques = [estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True)) for _ in range(2)]
+        except Exception as e:
+            arranques = [repr(e)]
+        correcto &= comprobar(
+            arranques == [([], [])] * 2 and os.path.exists(ruta_journal + '.corrupto'),
+            f"{formato}: un snapshot corrupto aparta también el journal y los arranques siguientes no fallan"
+        )
+    return correcto
+
+
+def verificar_fragmentos(num_libros: int = 200, hilos: int = 8, consultas: int = 300, fragmentos: int = 4) -> bool:
+    correcto = True
+    with tempfile.TemporaryDirectory() as directorio:
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca = gestor.BibliotecaFragmentada(fragmentos, os.path.join(directorio, 'biblioteca.json'))
+            biblioteca.importar_libros([gestor.Libro(i, f"Titulo {i}", "Autor", 1) for i in range(num_libros)])
+        with biblioteca:
+            errores: List[Tuple[int, List]] = []
+
+            def consultar(hilo: int):
+                azar = random.Random(hilo)
+                for _ in range(consultas):
+                    libro_id = azar.randrange(num_libros)
+                    libros = biblioteca.buscar_libro('id', str(libro_id))
+                    if [libro.id for libro in libros] != [libro_id]:
+                        errores.append((libro_id, libros))
+
+            trabajadores = [threading.Thread(target=consultar, args=(hilo,)) for hilo in range(hilos)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                for trabajador in trabajadores:
+                    trabajador.start()
+                for trabajador in trabajadores:
+                    trabajador.join()
+            correcto &= comprobar(not errores, f"{hilos} hilos reciben cada uno la respuesta de su propia consulta")
+
+            respuesta: List = []
+            with biblioteca._locks[0]:
+                consulta = threading.Thread(target=lambda: respuesta.extend(biblioteca.buscar_libro('id', '1')))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    consulta.start()
+                    consulta.join(5)
+            correcto &= comprobar([libro.id for libro in respuesta] == [1],
+                                  "una llamada en curso en un fragmento no bloquea a los demás")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                operar_en_hilos(biblioteca, num_libros, hilos, consultas)
+                libros = biblioteca.buscar_libro('stock', '1')
+            correcto &= comprobar(len(libros) == num_libros, "préstamos concurrentes repartidos entre fragmentos")
+    return correcto
+
+
+def verificar_concurrencia(hilos: int = 12, num_libros: int = 20, stock: int = 3) -> bool:
+    correcto = True
+    with tempfile.TemporaryDirectory() as directorio:
+        try:
+            abrir_biblioteca(os.path.join(directorio, 'biblioteca.json'), 'json', concurrente=True)
+            rechazado = False
+        except ValueError:
+            rechazado = True
+        correcto &= comprobar(rechazado, "el modo concurrente rechaza un snapshot por escritura")
+
+        intervalo = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for prueba, (formato, opciones) in enumerate([("json", {"journal": True, "compactar_cada": 7}),
+                                                          ("json", {"flush_cada": 5}),
+                                                          ("sqlite", {})]):
+                ruta = os.path.join(directorio, f"{prueba}_{gestor.ALMACENAMIENTOS[formato][1]}")
+                biblioteca = abrir_biblioteca(ruta, formato, concurrente=True, **opciones)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    biblioteca.importar_libros([gestor.Libro(i, f"Titulo {i}", "Autor", stock)
+                                                for i in range(num_libros)])
+                errores: List[str] = []
+
+                def trabajar(hilo: int):
+                    try:
+                        for libro_id in range(num_libros):
+                            for _ in range(stock):
+                                biblioteca.prestar_libro(libro_id, f"usuario{hilo}")
+                            if hilo % 2:
+                                biblioteca.devolver_libro(libro_id, f"usuario{hilo}")
+                        biblioteca.buscar_libro('texto', 'titulo 1')
+                        biblioteca.libros_por_stock(0, 1)
+                        biblioteca.calcular_multas()
+                    except Exception as e:
+                        errores.append(repr(e))
+
+                trabajadores = [threading.Thread(target=trabajar, args=(hilo,)) for hilo in range(hilos)]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for trabajador in trabajadores:
+                        trabajador.start()
+                    for trabajador in trabajadores:
+                        trabajador.join()
+                    biblioteca.flush()
+
+                libros, activos = estado_biblioteca(biblioteca)
+                stocks = [stock_libro for _, stock_libro in libros]
+                descripcion = f"{formato} {opciones or ''}".strip()
+                correcto &= comprobar(
+                    not errores and min(stocks) >= 0 and sum(stocks) + len(activos) == num_libros * stock,
+                    f"{descripcion}: {hilos} hilos sin errores, sin stock negativo y con stock conservado"
+                )
+                correcto &= comprobar(estado_biblioteca(abrir_biblioteca(ruta, formato)) == (libros, activos),
+                                      f"{descripcion}: la recarga coincide con el estado en memoria")
+        finally:
+            sys.setswitchinterval(intervalo)
+    return correcto
+
+
+def verificar_async(num_libros: int = 5_000, operaciones: int = 2_858) -> bool:
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'biblioteca.json')
+        ruta_catalogo = os.path.join(directorio, 'catalogo.cat')
+        generar_snapshot(ruta, num_libros, 0, 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            gestor.Biblioteca(ruta).generar_catalogo_mapeado(ruta_catalogo)
+            biblioteca = gestor.Biblioteca(ruta, catalogo=ruta_catalogo, notificaciones=gestor.BuzonNotificaciones())
+
+        async def prestar_todos():
+            return await asyncio.gather(*(biblioteca.prestar_libro_async(libro_id, f"usuario{libro_id}")
+                                          for libro_id in range(operaciones)), return_exceptions=True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultados = asyncio.run(prestar_todos())
+            recargada = gestor.Biblioteca(ruta, catalogo=ruta_catalogo)
+        errores = [resultado for resultado in resultados if isinstance(resultado, Exception)]
+        correcto = comprobar(not errores, f"{operaciones} préstamos async simultáneos con catálogo mapeado sin errores")
+        return correcto & comprobar(sorted(recargada._prestamos_activos) == sorted(biblioteca._prestamos_activos),
+                                    "los préstamos async están en disco al terminar")
+
+
+def notificaciones_enviadas(salida: str) -> List[Tuple[str, str]]:
+    enviadas = []
+    usuario = None
+    for linea in salida.splitlines():
+        if linea.startswith("📧 Notificación enviada a "):
+            enviadas.append(tuple(linea[len("📧 Notificación enviada a "):].split(": ", 1)))
+        elif linea.startswith("📧 ") and " notificaciones enviadas a " in linea:
+            usuario = linea.split(" notificaciones enviadas a ", 1)[1].rstrip(":")
+        elif linea.startswith("   - ") and usuario is not None:
+            enviadas.append((usuario, linea[len("   - "):]))
+    return enviadas
+
+
+def verificar_notificaciones() -> bool:
+    async def entregar(despachador, encolar) -> Optional[bool]:
+        aceptado = await encolar(despachador)
+        try:
+            await asyncio.wait_for(despachador.cerrar(), 15)
+        except asyncio.TimeoutError:
+            return None
+        return aceptado
+
+    async def mezclar(despachador):
+        aceptado = despachador.encolar("ana", "uno")
+        aceptado &= despachador.encolar_lote({"luis": ["dos"], "eva": ["tres"], "raul": ["cuatro"]})
+        return aceptado & despachador.encolar("ana", "cinco")
+
+    async def lote_de_dos(despachador):
+        return despachador.encolar("lia", "ocho") & despachador.encolar_lote({"sol": ["seis"], "mar": ["siete"]})
+
+    async def desbordar(despachador):
+        aceptado = despachador.encolar_lote({"pia": ["uno", "dos", "tres"], "teo": ["cuatro", "cinco"]})
+        for mensaje in ["seis", "siete", "ocho", "nueve"]:
+            await despachador.enviar("ivo", mensaje)
+        return aceptado
+
+    async def comprobar_todo():
+        return await asyncio.gather(
+            entregar(gestor.DespachadorNotificaciones(trabajadores=1, lote_maximo=8, ventana_ms=50), mezclar),
+            entregar(gestor.DespachadorNotificaciones(trabajadores=1, lote_maximo=8, ventana_ms=50), lote_de_dos),
+            entregar(gestor.DespachadorNotificaciones(trabajadores=1, capacidad=3, lote_maximo=3, ventana_ms=50),
+                     desbordar),
+        )
+
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        mezcla, dos, desborde = asyncio.run(comprobar_todo())
+    enviadas = sorted(notificaciones_enviadas(salida.getvalue()))
+
+    def enviadas_a(*usuarios: str) -> List[Tuple[str, str]]:
+        return [(usuario, mensaje) for usuario, mensaje in enviadas if usuario in usuarios]
+
+    correcto = comprobar(
+        mezcla is True and enviadas_a("ana", "luis", "eva", "raul") == sorted([
+            ("ana", "uno"), ("luis", "dos"), ("eva", "tres"), ("raul", "cuatro"), ("ana", "cinco")
+        ]),
+        "lotes y notificaciones sueltas mezclados en modo agrupado se entregan completos"
+    )
+    correcto &= comprobar(dos is True and enviadas_a("lia", "sol", "mar") == [("lia", "ocho"), ("mar", "siete"),
+                                                                             ("sol", "seis")],
+                          "un lote de dos usuarios entrega cada mensaje a su usuario")
+    return correcto & comprobar(
+        desborde is False and enviadas_a("pia", "teo", "ivo") == sorted([
+            ("pia", "uno"), ("pia", "dos"), ("pia", "tres"),
+            ("ivo", "seis"), ("ivo", "siete"), ("ivo", "ocho"), ("ivo", "nueve")
+        ]),
+        "la capacidad cuenta cada mensaje de un lote y enviar espera a que haya sitio"
+    )
+
+
+def verificar_lotes(formato: str = "json") -> bool:
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, gestor.ALMACENAMIENTOS[formato][1])
+        biblioteca = abrir_biblioteca(ruta, formato, journal=True, notificaciones=gestor.BuzonNotificaciones())
+        with contextlib.redirect_stdout(io.StringIO()):
+            biblioteca.importar_libros([gestor.Libro(1, "Uno", "Autor", 2), gestor.Libro(2, "Dos", "Autor", 1)])
+            prestamos = biblioteca.prestar_libros([(1, "ana"), (1, "ana"), (1, "luis"), (1, "eva"),
+                                                   (2, "ana"), (3, "ana")])
+        correcto = comprobar(
+            [resultado["exito"] for resultado in prestamos] == [True, False, True, False, True, False]
+            and sorted(usuario for usuario, _ in biblioteca.notificaciones.vaciar()) == ["ana", "ana", "luis"]
+            and estado_biblioteca(biblioteca) == ([(1, 0), (2, 0)], [(1, "ana"), (1, "luis"), (2, "ana")]),
+            f"{formato}: prestar_libros informa cada par y aplica solo los préstamos válidos"
+        )
+        correcto &= comprobar(estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True))
+                              == estado_biblioteca(biblioteca), f"{formato}: los préstamos en lote sobreviven a la recarga")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            devoluciones = biblioteca.devolver_libros([(1, "ana"), (1, "ana"), (2, "eva"), (2, "ana")])
+        correcto &= comprobar(
+            [resultado["exito"] for resultado in devoluciones] == [True, False, False, True]
+            and estado_biblioteca(biblioteca) == ([(1, 1), (2, 1)], [(1, "luis")]),
+            f"{formato}: devolver_libros informa cada par y aplica solo las devoluciones válidas"
+        )
+        return correcto & comprobar(estado_biblioteca(abrir_biblioteca(ruta, formato, journal=True))
+                                    == estado_biblioteca(biblioteca),
+                                    f"{formato}: las devoluciones en lote sobreviven a la recarga")
+
+
+def verificar() -> bool:
+    correcto = True
+    print("\n🧪 Recuperación del journal")
+    for formato in ("json", "binario"):
+        correcto &= verificar_journal(formato)
+    print("\n🧪 Fragmentos con varios hilos")
+    correcto &= verificar_fragmentos()
+    print("\n🧪 Modo concurrente")
+    correcto &= verificar_concurrencia()
+    print("\n🧪 Operaciones async")
+    correcto &= verificar_async()
+    print("\n🧪 Notificaciones y operaciones en lote")
+    correcto &= verificar_notificaciones()
+    for formato in ("json", "binario"):
+        correcto &= verificar_lotes(formato)
+    return correcto
+
+
+def benchmark_todo():
+    benchmark_memoria()
+    benchmark_multas()
+    benchmark_fechas()
+    benchmark_carga()
+    benchmark_formatos()
+    benchmark_catalogo()
+    benchmark_fsync()
+    benchmark_operaciones()
+    benchmark_fragmentos()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del gestor de biblioteca")
+    parser.add_argument("suite", nargs="?", choices=["todo", "operaciones", "fragmentos", "verificar"], default="todo")
+    parser.add_argument("--libros", type=int, default=20_000)
+    parser.add_argument("--usuarios", type=int, default=2_000)
+    parser.add_argument("--prestamos", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=500)
+    parser.add_argument("--repeticiones-persistencia", type=int, default=5)
+    parser.add_argument("--formato", choices=list(gestor.ALMACENAMIENTOS), default="json")
+    parser.add_argument("--sin-journal", action="store_true")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="resultados JSON de una ejecución anterior")
+    argumentos = parser.parse_args()
+
+    if argumentos.suite == "todo":
+        benchmark_todo()
+    elif argumentos.suite == "fragmentos":
+        benchmark_fragmentos()
+    elif argumentos.suite == "verificar":
+        sys.exit(0 if verificar() else 1)
+    else:
+        benchmark_operaciones(argumentos.libros, argumentos.usuarios, argumentos.prestamos, argumentos.repeticiones,
+                              argumentos.repeticiones_persistencia, argumentos.formato, not argumentos.sin_journal,
+                              argumentos.semilla, argumentos.salida, argumentos.comparar)